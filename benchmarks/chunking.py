@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+# Compares read size strategies of the CLI: total bytes read before the result
+# is enough, and wall time, over a stored corpus.
+#
+# Usage: python3 benchmarks/chunking.py [corpus_dir]
+#
+# Without corpus_dir, the pages from benchmarks/rawtext.py are used, together
+# with the synthetic pages from benchmarks/corpus.py.
+
+
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import title_squeezer  # noqa: E402
+import corpus  # noqa: E402
+import rawtext  # noqa: E402
+
+
+# (name, chunk_size, max_chunk_size)
+STRATEGIES = [
+    ('fixed 512', 512, 0),
+    ('fixed 2048', 2048, 0),
+    ('fixed 8192', 8192, 0),
+    ('fixed 65536', 65536, 0),
+    ('adaptive 512-65536', 512, 65536),
+    ('adaptive 2048-262144', 2048, 262144),
+]
+
+
+def load_corpus(path: [str, None]) -> list:
+    if path is not None:
+        return corpus.load(path)
+    documents = []
+    for kind in rawtext.BODIES:
+        for size in (4, 32, 256):
+            documents.append(('%s%d' % (kind, size), rawtext.make_page(kind, size * 1024)[0] + corpus.BODY))
+    for documents_in_group in corpus.synthetic(5).values():
+        documents += documents_in_group
+    return documents
+
+
+def run(documents: list, chunk_size: int, max_chunk_size: int) -> (int, float):
+    total_read = 0
+    started = time.perf_counter()
+    for _, page in documents:
+        chunks = []
+        squeezer = title_squeezer.Squeezer()
+        reader = io.BytesIO(page)
+        for data in title_squeezer._read_chunks(reader.read, chunk_size, max_chunk_size):
+            chunks.append(len(data))
+            if squeezer.feed(data).enough:
+                break
+        total_read += sum(chunks)
+    return total_read, time.perf_counter() - started
+
+
+def main():
+    documents = load_corpus(sys.argv[1] if len(sys.argv) > 1 else None)
+    total = sum(len(page) for _, page in documents)
+    print('%d documents, %d bytes' % (len(documents), total))
+    for name, chunk_size, max_chunk_size in STRATEGIES:
+        total_read, elapsed = min(run(documents, chunk_size, max_chunk_size) for _ in range(3))
+        print('%-22s %10d bytes read  %8.2f ms' % (name, total_read, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
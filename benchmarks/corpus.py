@@ -0,0 +1,120 @@
+# Benchmark corpora: synthetic pages, generated from a seed so that runs are
+# comparable, or a directory of real HTML files.
+
+
+import os
+import random
+
+import rawtext
+
+
+WORDS = (
+    'squeeze title page head meta script style content description open graph '
+    'news weather sport video search mail shopping travel finance market'
+).split()
+
+BODY = b'<body>' + b'<div class="text"><p>Some body text that nobody needs to read.</p></div>\n' * 2000
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def _head(rng: random.Random, charset: str='utf-8', extra: bytes=b'') -> bytes:
+    title = _words(rng, rng.randint(3, 10)).title()
+    description = _words(rng, rng.randint(10, 30))
+    return (
+        b'<!DOCTYPE html>\n<html lang="en">\n<head>\n' +
+        ('<meta charset="%s">\n' % charset).encode('ascii') + extra +
+        ('<title>%s &amp; co</title>\n' % title).encode(charset) +
+        ('<meta name="description" content="%s">\n' % description).encode(charset) +
+        b'</head>\n'
+    )
+
+
+def short_head(rng: random.Random) -> bytes:
+    return _head(rng) + BODY
+
+
+def long_script(rng: random.Random) -> bytes:
+    size = rng.choice((16, 64, 256)) * 1024
+    start, line, stop = rawtext.BODIES['script']
+    return _head(rng, extra=start + line * (size // len(line)) + stop + b'\n') + BODY
+
+
+def huge_comment(rng: random.Random) -> bytes:
+    size = rng.choice((16, 64, 256)) * 1024
+    start, line, stop = rawtext.BODIES['comment']
+    return _head(rng, extra=start + line * (size // len(line)) + stop + b'\n') + BODY
+
+
+def many_metas(rng: random.Random) -> bytes:
+    metas = b''.join(
+        b'<meta name="x-%d" content="%s">\n<link rel="preload" href="/static/%d.js" as="script" />\n' % (
+            i, _words(rng, 5).encode('ascii'), i
+        ) for i in range(rng.randint(100, 500))
+    )
+    return _head(rng, extra=metas) + BODY
+
+
+def attribute_heavy(rng: random.Random) -> bytes:
+    image = b'data:image/png;base64,' + b'iVBORw0KGgoAAAANSUhEUgAA' * rng.randint(100, 5000)
+    tags = b''.join(
+        b'<link rel=icon sizes=%dx%d type="image/png" data-a="1" data-b=\'2\' data-c=3 href="%s">\n' % (i, i, image)
+        for i in range(rng.randint(2, 10))
+    )
+    return _head(rng, extra=tags) + BODY
+
+
+def non_utf8(rng: random.Random) -> bytes:
+    charset, words = rng.choice((
+        ('shift_jis', '日本語のページのタイトル'),
+        ('gbk', '中文网页的标题和描述'),
+        ('windows-1251', 'Заголовок русской страницы'),
+        ('iso-8859-1', 'Titre de la page française'),
+    ))
+    title = words + ' ' + _words(rng, 3)
+    return (
+        ('<html><head><meta http-equiv="Content-Type" content="text/html; charset=%s">' % charset).encode('ascii') +
+        ('<title>%s</title><meta name="description" content="%s"></head>' % (title, words * 3)).encode(charset) +
+        BODY
+    )
+
+
+def no_head_end(rng: random.Random) -> bytes:
+    # Single-page app shells: no </head>, no description, read to the end
+    return (
+        b'<!DOCTYPE html><html><head><title>App</title>' +
+        b'<div id="root" data-state="%s"></div>\n' % _words(rng, 20).encode('ascii') * rng.randint(100, 1000)
+    )
+
+
+GENERATORS = {
+    'short_head': short_head,
+    'long_script': long_script,
+    'huge_comment': huge_comment,
+    'many_metas': many_metas,
+    'attribute_heavy': attribute_heavy,
+    'non_utf8': non_utf8,
+    'no_head_end': no_head_end,
+}
+
+
+def synthetic(count: int=20, seed: int=0) -> dict:
+    """Return {group name: [(document name, page)]} with count pages per group."""
+    rng = random.Random(seed)
+    return {
+        group: [('%s%d' % (group, i), generate(rng)) for i in range(count)]
+        for group, generate in GENERATORS.items()
+    }
+
+
+def load(path: str) -> list:
+    """Return [(file name, page)] for every file in the directory path."""
+    corpus = []
+    for name in sorted(os.listdir(path)):
+        full_path = os.path.join(path, name)
+        if os.path.isfile(full_path):
+            with open(full_path, 'rb') as f:
+                corpus.append((name, f.read()))
+    return corpus
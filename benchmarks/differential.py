@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+# Differential check of the Squeezer engines: feeds the same documents, split
+# into the same random chunks, to every engine and compares the Title results
+# and the parse state after every chunk with those of the reference 'byte'
+# engine. The documents are random tag soup full of the constructs the state
+# machine treats specially, well-formed random tags, and the synthetic pages
+# of benchmarks/corpus.py, every other one squeezed with META_RULES and the
+# rest with RULES, which also look at <html>.
+#
+# Usage: python3 benchmarks/differential.py [documents] [seed]
+
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import title_squeezer  # noqa: E402
+import corpus  # noqa: E402
+
+
+ENGINES = ('byte', 'scan', 'table')
+
+TOKENS = [
+    b'<', b'>', b'/', b'"', b'=', b'-', b'!', b' ', b'\n', b'\t', b'--', b'-->', b'<!--', b'<<', b'</', b'  ',
+    b'script', b'SCRIPT', b'Script', b'style', b'STYLE', b'title', b'TITLE', b'meta', b'head', b'body',
+    b'charset', b'http-equiv', b'content-type', b'text/html; charset=', b'name', b'description',
+    b'property', b'og:title', b'og:description', b'content', b'utf-8', b'latin1', b'bogus', b'shift_jis',
+    b'a', b'x', b'&amp;', b'\xe4\xbd\xa0', b'\xff', b'</script>', b'</style >', b'<title>', b'</title>',
+    b'<meta ', b'</head>', b'<script>', b'<style>', b'</scrip', b'<div>', b'<br/>',
+    b'<link rel=canonical href=/a>', b'<LINK REL="Canonical" HREF="/b">', b'<link rel=icon href=/c>',
+    b'<html lang=de>', b'<HTML LANG="DE">',
+]
+TAG_NAMES = [
+    b'meta', b'META', b'title', b'/title', b'script', b'/script', b'style', b'head', b'/head', b'body',
+    b'a', b'br', b'!doctype', b'link', b'LINK', b'html', b'div', b'/div', b'/', b'x"y',
+]
+ATTR_NAMES = [
+    b'charset', b'name', b'property', b'content', b'http-equiv', b'rel', b'href', b'lang', b'a', b'b"c', b'data-x'
+]
+ATTR_VALUES = [
+    b'', b'utf-8', b'"utf-8"', b'description', b'"og:title"', b'og:description', b'canonical', b'"Canonical"',
+    b'icon', b'de', b'"a b c"', b'x"y z"w',
+    b'"text/html; charset=latin1"', b'/path/x', b'"</script>"', b'a=b', b"'q r'", b'"&amp;\xe4\xbd\xa0"',
+    b'"unterminated',
+]
+SPACES = [b' ', b'  ', b'\n', b'\t ', b'']
+# Custom meta rules, on a tag META_RULES does not look at
+RULES = title_squeezer.META_RULES + ((b'html', b'lang', b'de', 'lang', b'lang'),)
+
+
+def tag_soup(rng: random.Random) -> bytes:
+    return b''.join(rng.choice(TOKENS) for _ in range(rng.randint(0, 300)))
+
+
+def random_tags(rng: random.Random) -> bytes:
+    parts = []
+    for _ in range(rng.randint(0, 60)):
+        if rng.random() < 0.4:
+            parts.append(rng.choice(TOKENS))
+            continue
+        parts += [b'<', rng.choice(TAG_NAMES)]
+        for _ in range(rng.randint(0, 3)):
+            parts += [rng.choice(SPACES[:4]), rng.choice(ATTR_NAMES)]
+            if rng.random() < 0.7:
+                parts += [b'=', rng.choice(ATTR_VALUES)]
+        parts += [rng.choice(SPACES), rng.choice([b'>', b'/>', b'>', b' />', b''])]
+    return b''.join(parts)
+
+
+def snapshot(squeezer: title_squeezer.Squeezer, result: title_squeezer.Title) -> tuple:
+    return (
+        result.enough, result.title, result.description, result.charset, result.title_decode, result.description_decode,
+        result.meta, squeezer.state, bytes(squeezer.lasttag), bytes(squeezer.lastattr),
+        None if squeezer.lastvalue is None else bytes(squeezer.lastvalue),
+        squeezer.lastattrs, squeezer.inside_title, squeezer.head_done, squeezer.eff_charset
+    )
+
+
+def run(engine: str, page: bytes, cuts: list, meta_rules: [tuple, None]) -> list:
+    squeezer = title_squeezer.Squeezer(engine=engine, meta_rules=meta_rules)
+    snapshots = []
+    for start, stop in zip([0] + cuts, cuts + [len(page)]):
+        snapshots.append(snapshot(squeezer, squeezer.feed(page[start:stop])))
+    snapshots.append(snapshot(squeezer, squeezer.feed(final=True)))
+    return snapshots
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = random.Random(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+    documents = [('soup%d' % i, tag_soup(rng)) for i in range(count // 2)]
+    documents += [('tags%d' % i, random_tags(rng)) for i in range(count - count // 2)]
+    for group in corpus.synthetic(2, rng.randrange(1 << 30)).values():
+        documents += group
+
+    mismatches = 0
+    for i, (name, page) in enumerate(documents):
+        cuts = sorted(rng.randint(0, len(page)) for _ in range(rng.randint(0, 8)))
+        meta_rules = RULES if i % 2 else None
+        expected = run(ENGINES[0], page, cuts, meta_rules)
+        for engine in ENGINES[1:]:
+            if run(engine, page, cuts, meta_rules) != expected:
+                mismatches += 1
+                print('MISMATCH %s engine %s cuts %r: %r' % (name, engine, cuts, page[:200]))
+    print('%d documents, %d engines, %d mismatches' % (len(documents), len(ENGINES), mismatches))
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
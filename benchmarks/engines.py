@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+# Runs every Squeezer engine over the same corpus, reports their throughput
+# and any document on which their results differ.
+#
+# Usage: python3 benchmarks/engines.py [corpus_dir] [chunk_size]
+#
+# Without corpus_dir, the synthetic pages from benchmarks/corpus.py are used.
+
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import title_squeezer  # noqa: E402
+import corpus  # noqa: E402
+
+
+ENGINES = ('scan', 'table', 'byte')
+
+
+def load_corpus(path: [str, None]) -> list:
+    if path is not None:
+        return corpus.load(path)
+    return [document for documents in corpus.synthetic(5).values() for document in documents]
+
+
+def squeeze(engine: str, page: bytes, chunk_size: int) -> tuple:
+    squeezer = title_squeezer.Squeezer(engine=engine)
+    for i in range(0, len(page), chunk_size):
+        squeezer.feed(page[i:i+chunk_size])
+    result = squeezer.feed(final=True)
+    return result.enough, result.title_decode, result.description_decode, result.charset, squeezer.state
+
+
+def main():
+    documents = load_corpus(sys.argv[1] if len(sys.argv) > 1 else None)
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 2048
+    total = sum(len(page) for _, page in documents)
+    results = {}
+    for engine in ENGINES:
+        started = time.perf_counter()
+        results[engine] = [squeeze(engine, page, chunk_size) for _, page in documents]
+        elapsed = time.perf_counter() - started
+        print('%-6s %4d documents  %10d bytes  %8.2f MB/s' % (engine, len(documents), total, total / elapsed / 1e6))
+    mismatches = 0
+    for i, (name, _) in enumerate(documents):
+        expected = results[ENGINES[0]][i]
+        for engine in ENGINES[1:]:
+            if results[engine][i] != expected:
+                mismatches += 1
+                print('MISMATCH %s: %s=%r %s=%r' % (name, ENGINES[0], expected, engine, results[engine][i]))
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
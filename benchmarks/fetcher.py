@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+# Checks Fetcher against pages served by http.server on localhost: a plain
+# page, gzip and deflate encoded ones, the latter zlib wrapped or raw as
+# many servers send it, one whose body is much larger than its <head>,
+# which must be given up on once the result is enough, pages in charsets
+# other than UTF-8, declared by the Content-Type header or by <meta>, and a
+# gzip encoded UTF-16 page whose gzip header comes in a chunk of its own.
+#
+# Usage: python3 benchmarks/fetcher.py
+#
+# Exits with status 1 when a page gives an unexpected result.
+
+
+import asyncio
+import gzip
+import http.server
+import os
+import sys
+import threading
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import title_squeezer  # noqa: E402
+
+
+HEAD = '<html><head><title>Заголовок</title><meta name="description" content="Описание"></head>'
+# Bytes of body sent after HEAD by /large, far more than Fetcher may receive
+LARGE_SIZE = 16 * 1024 * 1024
+LARGE_CHUNK = b'<p>' + b'x' * 8189 + b'</p>'
+
+PAGES = {
+    '/plain': ('text/html; charset=utf-8', {}, HEAD.encode('utf-8')),
+    '/gzip': ('text/html; charset=utf-8', {'Content-Encoding': 'gzip'}, gzip.compress(HEAD.encode('utf-8'))),
+    '/cp1251': ('text/html; charset=windows-1251', {}, HEAD.encode('cp1251')),
+    '/koi8-r': ('text/html', {}, ('<meta charset="koi8-r">' + HEAD).encode('koi8-r')),
+    '/deflate': ('text/html; charset=utf-8', {'Content-Encoding': 'deflate'}, zlib.compress(HEAD.encode('utf-8'))),
+    '/raw-deflate': (
+        'text/html; charset=utf-8', {'Content-Encoding': 'deflate'},
+        zlib.compress(HEAD.encode('utf-8'), wbits=-zlib.MAX_WBITS)
+    ),
+}
+# Sent chunked, the first 10 bytes being the gzip header alone, which inflate
+# to nothing
+GZIP_UTF16 = gzip.compress(HEAD.encode('utf-16'))
+
+# path: (title, description, eff_charset, enough)
+EXPECTED = {
+    '/plain': ('Заголовок', 'Описание', 'utf-8', True),
+    '/gzip': ('Заголовок', 'Описание', 'utf-8', True),
+    '/cp1251': ('Заголовок', 'Описание', 'cp1251', True),
+    '/koi8-r': ('Заголовок', 'Описание', 'koi8-r', True),
+    '/deflate': ('Заголовок', 'Описание', 'utf-8', True),
+    '/raw-deflate': ('Заголовок', 'Описание', 'utf-8', True),
+    '/large': ('Заголовок', 'Описание', 'utf-8', True),
+    # Transcoded to UTF-8 as it is fed
+    '/gzip-utf-16': ('Заголовок', 'Описание', 'UTF-8', True),
+}
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/large':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            try:
+                self.write_chunk(HEAD.encode('utf-8'))
+                for _ in range(LARGE_SIZE // len(LARGE_CHUNK)):
+                    self.write_chunk(LARGE_CHUNK)
+                self.wfile.write(b'0\r\n\r\n')
+            except ConnectionError:
+                # Closed by Fetcher once the result was enough
+                self.close_connection = True
+            return
+        if self.path == '/gzip-utf-16':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.write_chunk(GZIP_UTF16[:10])
+            self.wfile.flush()
+            self.write_chunk(GZIP_UTF16[10:])
+            self.wfile.write(b'0\r\n\r\n')
+            return
+        if self.path not in PAGES:
+            self.send_error(404)
+            return
+        content_type, headers, body = PAGES[self.path]
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def log_message(self, *args):
+        pass
+
+
+async def fetch_all(base: str) -> (list, int):
+    async with title_squeezer.Fetcher() as fetcher:
+        results = [(path, await fetcher.squeeze(base + path)) for path in EXPECTED]
+        return results, fetcher.bytes_received
+
+
+def main():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        results, bytes_received = asyncio.run(fetch_all('http://127.0.0.1:%d' % server.server_address[1]))
+    finally:
+        server.shutdown()
+        server.server_close()
+    failures = 0
+    for path, result in results:
+        got = (result.title_decode, result.description_decode, result.eff_charset, result.enough)
+        if got != EXPECTED[path]:
+            print('%-10s expected %r, got %r' % (path, EXPECTED[path], got))
+            failures += 1
+    # Everything but /large fits in a few KB, and Fetcher must have stopped
+    # reading /large within a few reads of its <head>
+    if bytes_received > 1024 * 1024:
+        print('received %d bytes, /large was not given up on' % bytes_received)
+        failures += 1
+    print('%d pages, %d bytes received, %d failures' % (len(results), bytes_received, failures))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+# Measures how squeeze_many scales with the number of worker processes, on
+# stored files so that only their paths are sent to the workers.
+#
+# Usage: python3 benchmarks/many.py [documents] [max_workers]
+
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import title_squeezer  # noqa: E402
+import rawtext  # noqa: E402
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as corpus:
+        paths = []
+        for i in range(count):
+            kind = list(rawtext.BODIES)[i % len(rawtext.BODIES)]
+            paths.append(os.path.join(corpus, '%d.html' % i))
+            with open(paths[-1], 'wb') as f:
+                f.write(rawtext.make_page(kind, 16 * 1024)[0])
+        baseline = None
+        workers = 1
+        while workers <= max_workers:
+            started = time.perf_counter()
+            results = list(title_squeezer.squeeze_many(paths, workers=workers))
+            elapsed = time.perf_counter() - started
+            assert len(results) == count and all(result.title_decode == 'Benchmark' for result in results)
+            baseline = baseline or elapsed
+            print('%3d workers  %10.0f documents/s  speedup %5.2f' % (workers, count / elapsed, baseline / elapsed))
+            workers *= 2
+
+
+if __name__ == '__main__':
+    main()
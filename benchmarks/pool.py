@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+# Compares constructing a Squeezer for every document with reusing one from a
+# SqueezerPool, on small pages where the construction cost matters most. Each
+# way is timed once getting a Squeezer alone, which is all the pool can save,
+# and once squeezing the page with it as well.
+#
+# Usage: python3 benchmarks/pool.py [documents] [rounds]
+
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import title_squeezer  # noqa: E402
+
+PAGE = b'<html><head><meta charset="utf-8"><title>Benchmark</title></head><body>'
+
+
+def construct(pages: list, feed: bool):
+    for page in pages:
+        squeezer = title_squeezer.Squeezer()
+        if feed:
+            squeezer.feed(page)
+
+
+def pooled(pages: list, feed: bool):
+    pool = title_squeezer.SqueezerPool()
+    for page in pages:
+        with pool.squeezer() as squeezer:
+            if feed:
+                squeezer.feed(page)
+
+
+def reset(pages: list, feed: bool):
+    squeezer = title_squeezer.Squeezer()
+    for page in pages:
+        squeezer.reset()
+        if feed:
+            squeezer.feed(page)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 9
+    pages = [PAGE] * count
+    runs = [(name, run, feed) for feed in (False, True) for name, run in (
+        ('construct', construct), ('pool', pooled), ('reset', reset)
+    )]
+    # Rounds interleave the runs, so that a noisy neighbour slows all of them
+    best = dict.fromkeys(range(len(runs)), float('inf'))
+    for _ in range(rounds):
+        for i, (_, run, feed) in enumerate(runs):
+            started = time.perf_counter()
+            run(pages, feed)
+            best[i] = min(best[i], time.perf_counter() - started)
+    for i, (name, _, feed) in enumerate(runs):
+        baseline = best[0 if not feed else 3]
+        print('%-10s %-8s %10.0f documents/s  %6.2f us/document  speedup %5.2f' % (
+            name, 'squeeze' if feed else 'get', count / best[i], best[i] / count * 1e6, baseline / best[i]
+        ))
+    print('Squeezer size: %d bytes' % sys.getsizeof(title_squeezer.Squeezer()))
+
+
+if __name__ == '__main__':
+    main()
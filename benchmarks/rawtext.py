@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+# Measures how fast Squeezer skips the bodies of comments, <script> and
+# <style> elements, which often fill the first hundreds of KB of a page.
+#
+# Usage: python3 benchmarks/rawtext.py [body_kib] [chunk_size]
+
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import title_squeezer  # noqa: E402
+
+
+BODIES = {
+    'script': (
+        b'<script>',
+        b'for (var i = 0; i < n; i++) { el.innerHTML += "<li>" + items[i] + "</li>"; }\n',
+        b'</script>'
+    ),
+    'style': (
+        b'<style>',
+        b'.nav > li:first-child { background: url(/img/bg.png); color: #333; }\n',
+        b'</style>'
+    ),
+    'comment': (
+        b'<!--',
+        b'<div class="legacy"> -- disabled - do not remove -- </div>\n',
+        b'-->'
+    ),
+}
+
+
+def make_page(kind: str, body_size: int) -> (bytes, int):
+    start, line, stop = BODIES[kind]
+    body = line * (body_size // len(line) + 1)
+    page = b'<!DOCTYPE html>\n<html><head>\n' + start + body + stop + b'\n<title>Benchmark</title>\n</head>'
+    return page, len(body)
+
+
+def run(page: bytes, chunk_size: int) -> float:
+    squeezer = title_squeezer.Squeezer()
+    started = time.perf_counter()
+    for i in range(0, len(page), chunk_size):
+        result = squeezer.feed(page[i:i+chunk_size])
+    elapsed = time.perf_counter() - started
+    assert result.enough and result.title_decode == 'Benchmark'
+    return elapsed
+
+
+def main():
+    body_size = int(sys.argv[1]) * 1024 if len(sys.argv) > 1 else 512 * 1024
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 2048
+    for kind in BODIES:
+        page, raw_size = make_page(kind, body_size)
+        elapsed = min(run(page, chunk_size) for _ in range(5))
+        print('%-8s %8d bytes  %10.2f MB/s' % (kind, raw_size, raw_size / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    main()
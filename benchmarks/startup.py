@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Measures what a command line invocation costs before and besides parsing:
+# the interpreter alone, importing title_squeezer, squeezing a small page from
+# stdin as a script and as a module, and through a --serve process, and lists
+# the slowest imports as reported by python3 -X importtime.
+#
+# Usage: python3 benchmarks/startup.py [runs] [budget_ms]
+#
+# With budget_ms, exits with status 1 when squeezing a page with
+# python3 -m title_squeezer takes longer than that.
+
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SCRIPT = os.path.join(ROOT, 'title_squeezer.py')
+PAGE = b'<html><head><meta charset="utf-8"><title>Benchmark</title></head><body>'
+# Cached bytecode is what an installed copy runs from
+ENV = {name: value for name, value in os.environ.items() if name != 'PYTHONDONTWRITEBYTECODE'}
+
+
+def run(command: list, runs: int) -> float:
+    # Median wall time in milliseconds
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, input=PAGE, stdout=subprocess.DEVNULL, check=True, cwd=ROOT, env=ENV)
+        times.append((time.perf_counter() - started) * 1e3)
+    return statistics.median(times)
+
+
+def slowest_imports(count: int=10) -> list:
+    report = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import title_squeezer'],
+        stderr=subprocess.PIPE, check=True, cwd=ROOT, env=ENV
+    ).stderr.decode()
+    imports = []
+    # Lines look like "import time:  <own us> | <cumulative us> | <module>"
+    for line in report.splitlines()[1:]:
+        own, cumulative, name = line.split(':', 1)[1].split('|')
+        imports.append((int(cumulative), int(own), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    # Compile the bytecode once, outside of the measurements
+    run([sys.executable, '-c', 'import title_squeezer'], 1)
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, 'squeezer.sock')
+        server = subprocess.Popen([sys.executable, SCRIPT, '--serve', socket_path], cwd=ROOT, env=ENV)
+        try:
+            while not os.path.exists(socket_path):
+                if server.poll() is not None:
+                    sys.exit('title_squeezer.py --serve exited with status %d' % server.returncode)
+                time.sleep(0.01)
+            results = (
+                ('python3 -c pass', run([sys.executable, '-c', 'pass'], runs)),
+                ('import title_squeezer', run([sys.executable, '-c', 'import title_squeezer'], runs)),
+                ('title_squeezer.py', run([sys.executable, SCRIPT], runs)),
+                ('-m title_squeezer', run([sys.executable, '-m', 'title_squeezer'], runs)),
+                ('-m title_squeezer --connect', run([sys.executable, '-m', 'title_squeezer', '--connect', socket_path], runs)),
+            )
+        finally:
+            server.terminate()
+            server.wait()
+    for name, milliseconds in results:
+        print('%-30s %8.1f ms' % (name, milliseconds))
+    print()
+    print('%-30s %8s %8s' % ('slowest imports', 'ms', 'own ms'))
+    for cumulative, own, name in slowest_imports():
+        print('%-30s %8.1f %8.1f' % (name, cumulative / 1e3, own / 1e3))
+    module = dict(results)['-m title_squeezer']
+    if budget is not None and module > budget:
+        print('over budget: %.1f ms > %.1f ms' % (module, budget))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+# Round trip check of Squeezer.getstate and from_state: feeds the documents
+# of benchmarks/differential.py, split into random chunks, to a Squeezer and
+# to one that is packed and restored after every chunk, through from_state
+# or pickle in turn, with every engine, and compares their results and parse
+# state after every chunk. Some go with max_bytes, the custom RULES of
+# benchmarks/differential.py or a UTF-16 Content-Type. Also checks that a
+# tag with thousands of attributes packs into as little as one with none.
+#
+# Usage: python3 benchmarks/state.py [documents] [seed]
+#
+# Exits with status 1 when a restored Squeezer differs or a state is too large.
+
+
+import codecs
+import os
+import pickle
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import title_squeezer  # noqa: E402
+import corpus  # noqa: E402
+import differential  # noqa: E402
+
+
+UTF16_PAGES = [
+    codecs.BOM_UTF16_LE + '<title>Заголовок</title><meta name=description content=Описание></head>'.encode('utf-16-le'),
+    '<html><title>Заголовок</title>'.encode('utf-16-be'),
+]
+
+
+def round_trip(page: bytes, cuts: list, options: dict) -> (bool, list):
+    # Return whether the restored Squeezer kept up with the one fed straight,
+    # and the sizes of its states
+    straight = title_squeezer.Squeezer(**options)
+    restored = title_squeezer.Squeezer(**options)
+    sizes = []
+    for i, (start, stop) in enumerate(zip([0] + cuts, cuts + [len(page)])):
+        expected = differential.snapshot(straight, straight.feed(page[start:stop]))
+        result = restored.feed(page[start:stop])
+        if differential.snapshot(restored, result) != expected or result.as_dict() != straight.last_result.as_dict():
+            return False, sizes
+        state = restored.getstate()
+        sizes.append(len(state))
+        if i % 2:
+            restored = pickle.loads(pickle.dumps(restored))
+        else:
+            restored = title_squeezer.Squeezer.from_state(state)
+        if restored.getstate() != state:
+            return False, sizes
+    expected = differential.snapshot(straight, straight.feed(final=True))
+    return differential.snapshot(restored, restored.feed(final=True)) == expected, sizes
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rng = random.Random(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+    documents = [('soup%d' % i, differential.tag_soup(rng)) for i in range(count // 2)]
+    documents += [('tags%d' % i, differential.random_tags(rng)) for i in range(count - count // 2)]
+    for group in corpus.synthetic(2, rng.randrange(1 << 30)).values():
+        documents += group
+    documents += [('utf-16-%d' % i, page) for i, page in enumerate(UTF16_PAGES)]
+
+    failures = 0
+    sizes = []
+    for i, (name, page) in enumerate(documents):
+        cuts = sorted(rng.randint(0, len(page)) for _ in range(rng.randint(0, 8)))
+        options = {'max_bytes': rng.choice((0, 0, 500))}
+        if i % 3 == 0:
+            options['meta_rules'] = differential.RULES
+        if i % 5 == 0:
+            options['content_type'] = 'text/html; charset=utf-16'
+        for engine in differential.ENGINES:
+            ok, document_sizes = round_trip(page, cuts, dict(options, engine=engine))
+            sizes += document_sizes
+            if not ok:
+                failures += 1
+                print('MISMATCH %s engine %s options %r cuts %r: %r' % (name, engine, options, cuts, page[:200]))
+
+    # Only the attributes the meta rules read are kept, however many a tag has
+    squeezer = title_squeezer.Squeezer()
+    squeezer.feed(b'<meta ' + b' '.join(b'a%d="%s"' % (i, b'x' * 1000) for i in range(5000)) + b' ')
+    state = squeezer.getstate()
+    if len(state) > 128:
+        failures += 1
+        print('a tag with 5000 attributes packs into %d bytes' % len(state))
+
+    sizes.sort()
+    print('%d documents, %d states, median %d bytes, max %d bytes, %d failures' % (
+        len(documents), len(sizes), sizes[len(sizes) // 2], sizes[-1], failures
+    ))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+# Throughput benchmark for Squeezer over synthetic pages and real HTML.
+#
+# For every corpus group, engine and chunk size, pages are fed chunk by chunk
+# until the result is enough, as the CLI does. It reports MB/s over the bytes
+# consumed, bytes consumed before enough, per-document latency percentiles
+# and peak memory, and writes them as JSON, so that runs can be compared with
+# --baseline to gate regressions.
+#
+# Usage: python3 benchmarks/suite.py [--corpus DIR] [--output FILE]
+#                                    [--baseline FILE] [--tolerance 0.2]
+
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import title_squeezer  # noqa: E402
+import corpus  # noqa: E402
+
+
+def squeeze(page: bytes, engine: str, chunk_size: int) -> int:
+    squeezer = title_squeezer.Squeezer(engine=engine)
+    consumed = 0
+    for i in range(0, len(page), chunk_size):
+        data = page[i:i+chunk_size]
+        consumed += len(data)
+        if squeezer.feed(data).enough:
+            return consumed
+    squeezer.feed(final=True)
+    return consumed
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure(documents: list, engine: str, chunk_size: int, rounds: int) -> dict:
+    latencies = []
+    consumed = []
+    for _, page in documents:
+        best = None
+        for _ in range(rounds):
+            started = time.perf_counter()
+            size = squeeze(page, engine, chunk_size)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        latencies.append(best)
+        consumed.append(size)
+
+    tracemalloc.start()
+    for _, page in documents:
+        squeeze(page, engine, chunk_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'engine': engine,
+        'chunk_size': chunk_size,
+        'documents': len(documents),
+        'bytes_total': sum(len(page) for _, page in documents),
+        'bytes_consumed': sum(consumed),
+        'mb_per_s': sum(consumed) / sum(latencies) / 1e6,
+        'latency_ms': {
+            'p50': percentile(latencies, 0.5) * 1000,
+            'p90': percentile(latencies, 0.9) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'max': max(latencies) * 1000,
+        },
+        'peak_memory_bytes': peak,
+    }
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    key = lambda result: (result['group'], result['engine'], result['chunk_size'])  # noqa: E731
+    previous = {key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(key(result))
+        if old is not None and result['mb_per_s'] < old['mb_per_s'] * (1 - tolerance):
+            regressions.append('%s %s chunk %d: %.2f MB/s, was %.2f MB/s' % (
+                result['group'], result['engine'], result['chunk_size'], result['mb_per_s'], old['mb_per_s']
+            ))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Squeezer throughput benchmark.')
+    parser.add_argument('--corpus', help='directory of real HTML files, benchmarked as group "corpus"')
+    parser.add_argument('--synthetic', type=int, default=20, help='synthetic pages per group, 0 to skip (default: 20)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic pages (default: 0)')
+    parser.add_argument('--engine', action='append', choices=('scan', 'table', 'byte'), help='engine to run, may be repeated (default: scan)')
+    parser.add_argument('--chunk-size', type=int, action='append', help='chunk size to sweep, may be repeated (default: 512, 2048, 8192, 65536)')
+    parser.add_argument('--rounds', type=int, default=3, help='runs per document, the fastest counts (default: 3)')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--baseline', help='JSON report to compare with, exits with 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed MB/s drop against the baseline (default: 0.2)')
+    args = parser.parse_args()
+
+    groups = corpus.synthetic(args.synthetic, args.seed) if args.synthetic > 0 else {}
+    if args.corpus:
+        groups['corpus'] = corpus.load(args.corpus)
+    results = []
+    for group, documents in groups.items():
+        if not documents:
+            continue
+        for engine in args.engine or ['scan']:
+            for chunk_size in args.chunk_size or [512, 2048, 8192, 65536]:
+                result = dict(group=group, **measure(documents, engine, chunk_size, args.rounds))
+                results.append(result)
+                sys.stderr.write('%-16s %-5s %6d  %8.2f MB/s  %10d/%-10d bytes  p50 %7.3f ms  p99 %7.3f ms  peak %8d bytes\n' % (
+                    group, engine, chunk_size, result['mb_per_s'], result['bytes_consumed'], result['bytes_total'],
+                    result['latency_ms']['p50'], result['latency_ms']['p99'], result['peak_memory_bytes']
+                ))
+
+    report = json.dumps({'python': platform.python_version(), 'results': results}, indent=4)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        sys.stdout.write(report + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        for regression in regressions:
+            sys.stderr.write('REGRESSION %s\n' % regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+# Checks squeeze_warc against archives built from the synthetic pages of
+# benchmarks/corpus.py, as response records, plain, gzip or chunked, and as
+# resource records, among request and metadata records. The intact archives,
+# uncompressed, gzipped record by record, gzipped as a whole and a mix of
+# the first two, must give every page the result of squeezing it alone. The
+# damaged ones, with junk, oversized header blocks, bad lengths or broken
+# gzip members between or within the records, must give every record that
+# was left intact and report the rest as a WarcError, never raise.
+#
+# Usage: python3 benchmarks/warc.py [pages per group] [seed]
+#
+# Exits with status 1 when an archive gives an unexpected result.
+
+
+import gzip
+import os
+import random
+import sys
+import tempfile
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import title_squeezer  # noqa: E402
+import corpus  # noqa: E402
+
+
+def record(warc_type: str, record_id: str, content_type: str, block: bytes) -> bytes:
+    head = (
+        'WARC/1.0\r\nWARC-Type: %s\r\nWARC-Record-ID: <urn:uuid:%s>\r\nWARC-Target-URI: http://example.com/%s\r\n'
+        'Content-Type: %s\r\nContent-Length: %d\r\n\r\n' % (warc_type, record_id, record_id, content_type, len(block))
+    )
+    return head.encode('ascii') + block + b'\r\n\r\n'
+
+
+def response(record_id: str, headers: bytes, body: bytes) -> bytes:
+    block = b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n' + headers + b'\r\n' + body
+    return record('response', record_id, 'application/http; msgtype=response', block)
+
+
+def chunked(body: bytes, rng: random.Random) -> bytes:
+    chunks = []
+    while body:
+        size = rng.randint(1, 5000)
+        chunks.append(b'%x;ext\r\n%s\r\n' % (len(body[:size]), body[:size]))
+        body = body[size:]
+    return b''.join(chunks) + b'0\r\n\r\n'
+
+
+def build(count: int, seed: int) -> (dict, list):
+    # Return {record ID: page} and the records of an archive holding them
+    rng = random.Random(seed)
+    pages = [page for group in corpus.synthetic(count, seed).values() for _, page in group]
+    # Larger than a gzip member is inflated at a time, and incompressible
+    pages.append(rng.randbytes(200000) + b'<title>Incompressible</title>')
+    expected = {}
+    records = []
+    for i, page in enumerate(pages):
+        record_id = 'page%d' % i
+        expected['<urn:uuid:%s>' % record_id] = page
+        records.append(record('request', 'request%d' % i, 'application/http; msgtype=request', b'GET / HTTP/1.1\r\n\r\n'))
+        if i % 4 == 0:
+            records.append(response(record_id, b'', page))
+        elif i % 4 == 1:
+            records.append(response(record_id, b'Content-Encoding: gzip\r\n', gzip.compress(page)))
+        elif i % 4 == 2:
+            records.append(response(record_id, b'Transfer-Encoding: chunked\r\n', chunked(page, rng)))
+        else:
+            records.append(record('resource', record_id, 'text/html', page))
+        records.append(record('metadata', 'metadata%d' % i, 'text/plain', b'x' * 100))
+    return expected, records
+
+
+def squeeze_alone(page: bytes) -> dict:
+    squeezer = title_squeezer.Squeezer()
+    for start in range(0, len(page), 16384):
+        if squeezer.feed(page[start:start+16384]).enough:
+            break
+    return squeezer.feed(final=True).as_dict()
+
+
+def break_header(member: bytes) -> bytes:
+    # Overwrite 4 bytes of member, past its first 4 KiB inflated, so that
+    # inflating it fails within the HTTP header block
+    header_size = zlib.decompress(member, 16 + zlib.MAX_WBITS).index(b'\r\n\r\n<title>')
+    for offset in range(1000, len(member) - 8, 100):
+        broken = member[:offset] + b'\xff\xff\xff\xff' + member[offset+4:]
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        inflated = 0
+        try:
+            for start in range(0, len(broken), 64):
+                inflated += len(decompressor.decompress(broken[start:start+64]))
+        except zlib.error:
+            # Failing neither in the first 4 KiB inflated nor past the header
+            if 4096 < inflated < header_size:
+                return broken
+    raise AssertionError('no offset breaks the header block')
+
+
+def damaged(records: list, rng: random.Random) -> dict:
+    # Return {name: (archive, record IDs lost)}
+    members = [gzip.compress(data) for data in records]
+    junk = b'garbage that is not a record\r\n'
+    big_head = b'WARC/1.0\r\nX-Pad: ' + b'a' * 70000 + b'\r\nContent-Length: 0\r\n\r\n\r\n\r\n'
+    bad_length = b'WARC/1.0\r\nContent-Length: nope\r\n\r\nzz\r\n\r\n'
+    # A gzip member damaged within an HTTP header block too large to be
+    # inflated in one go
+    cookie = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(60000)).encode('ascii')
+    cookie_member = break_header(gzip.compress(response('cookie', b'Set-Cookie: ' + cookie + b'\r\n', b'<title>x</title>')))
+    # records[1] is the response record of page0
+    return {
+        'plain, CRLF between records': (b'\r\n'.join(records), ()),
+        'gzip, CRLF between records': (b'\r\n'.join(members), ()),
+        'plain, junk': (records[0] + junk + b''.join(records[1:]), ()),
+        'gzip, junk': (members[0] + junk + b''.join(members[1:]), ()),
+        'plain, leading junk': (junk + b''.join(records), ()),
+        'plain, trailing junk': (b''.join(records) + junk, ()),
+        'plain, oversized header block': (records[0] + big_head + b''.join(records[1:]), ()),
+        'gzip, oversized header block': (members[0] + gzip.compress(big_head) + b''.join(members[1:]), ()),
+        'plain, bad Content-Length': (records[0] + bad_length + b''.join(records[1:]), ()),
+        'gzip, truncated member': (
+            members[0] + members[1][:40] + b'\x00' * 50 + b''.join(members[2:]), ('<urn:uuid:page0>',)
+        ),
+        'gzip, damaged HTTP header block': (
+            members[0] + bytes(cookie_member) + b''.join(members[1:]), ('<urn:uuid:cookie>',)
+        ),
+    }
+
+
+def check(name: str, path: str, expected: dict, lost: tuple, errors: bool) -> int:
+    # Return the number of failures
+    try:
+        got = list(title_squeezer.squeeze_warc(path))
+    except Exception as e:
+        print('%-32s raised %r' % (name, e))
+        return 1
+    failures = 0
+    results = {}
+    error_count = 0
+    for record_id, _, result in got:
+        if isinstance(result, title_squeezer.WarcError):
+            error_count += 1
+            if record_id is not None:
+                results[record_id] = result
+        else:
+            results[record_id] = result
+    for record_id in lost:
+        if not isinstance(results.pop(record_id, None), (title_squeezer.WarcError, type(None))):
+            print('%-32s %s should be lost' % (name, record_id))
+            failures += 1
+    if list(results) != [record_id for record_id in expected if record_id not in lost]:
+        print('%-32s records %s' % (name, list(results)))
+        failures += 1
+    for record_id, result in results.items():
+        if record_id in expected and result.as_dict() != squeeze_alone(expected[record_id]):
+            print('%-32s %s: %r' % (name, record_id, result.as_dict()))
+            failures += 1
+    if bool(error_count) != errors:
+        print('%-32s %d errors' % (name, error_count))
+        failures += 1
+    # squeeze_warcs must give the same, with no error for the file itself
+    records = next(title_squeezer.squeeze_warcs([path], workers=1))[1]
+    if isinstance(records, Exception) or len(records) != len(got):
+        print('%-32s squeeze_warcs gave %r' % (name, records))
+        failures += 1
+    print('%-32s %d records, %d errors' % (name, len(got) - error_count, error_count))
+    return failures
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    expected, records = build(count, seed)
+    archives = {
+        'plain': (b''.join(records), ()),
+        'gzip by record': (b''.join(gzip.compress(data) for data in records), ()),
+        'gzip as a whole': (gzip.compress(b''.join(records)), ()),
+        'mixed': (b''.join(gzip.compress(data) if i % 2 else data for i, data in enumerate(records)), ()),
+    }
+    intact = len(archives)
+    archives.update(damaged(records, random.Random(seed)))
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'archive.warc')
+        for i, (name, (data, lost)) in enumerate(archives.items()):
+            with open(path, 'wb') as f:
+                f.write(data)
+            failures += check(name, path, expected, lost, errors=i >= intact and 'CRLF' not in name)
+    print('%d archives, %d failures' % (len(archives), failures))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
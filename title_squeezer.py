@@ -8,33 +8,87 @@
 # any damage or problems caused by this program.
 
 
-import enum
-import html
-import json
+# Modules only some features need, like asyncio for Fetcher, are imported
+# where they are used, so that squeezing one page from the command line does
+# not pay for importing them
+import codecs
+import collections
+import contextlib
+import functools
+import itertools
+import mmap
+import os
+import re
+import struct
 import sys
+import time
+import zlib
 
 
 class Title:
 
-    def __init__(self, enough: bool, title: str, description: str, charset: str, eff_charset: str):
+    # title_decode and description_decode are decoded on first access only,
+    # since callers usually look at nothing but enough until the last chunk
+    __slots__ = (
+        'enough', 'title', 'description', 'charset', 'eff_charset', 'meta', 'budget_exhausted', 'bytes_consumed',
+        '_title_decode', '_description_decode'
+    )
+
+    def __init__(
+        self, enough: bool, title: bytes, description: bytes, charset: str, eff_charset: str, meta: [dict, None]=None,
+        budget_exhausted: [bool, None]=None, bytes_consumed: int=0
+    ):
         self.enough = enough
         self.title = title
         self.description = description
         self.charset = charset
+        self.eff_charset = eff_charset
+        # Every field found by the meta rules, like 'og:image', as raw bytes
+        self.meta = meta if meta is not None else {}
+        # Whether the Squeezer stopped at its max_bytes or deadline before the
+        # result was enough, or None if it had neither, and the number of
+        # bytes it was fed until then, or 0 if it had neither
+        self.budget_exhausted = budget_exhausted
+        self.bytes_consumed = bytes_consumed
 
-        if title is not None:
-            self.title_decode = html.unescape(title.decode(eff_charset, 'replace'))
-        else:
-            self.title_decode = None
-        if description is not None:
-            self.description_decode = html.unescape(description.decode(eff_charset, 'replace'))
+    @property
+    def title_decode(self) -> [str, None]:
+        try:
+            return self._title_decode
+        except AttributeError:
+            self._title_decode = self._decode(self.title)
+            return self._title_decode
+
+    @property
+    def description_decode(self) -> [str, None]:
+        try:
+            return self._description_decode
+        except AttributeError:
+            self._description_decode = self._decode(self.description)
+            return self._description_decode
+
+    def _decode(self, s: [bytes, None]) -> [str, None]:
+        if s is None:
+            return None
         else:
-            self.description_decode = None
+            import html
+            return html.unescape(s.decode(self.eff_charset, 'replace'))
 
     def __str__(self):
-        return json.dumps({
+        import json
+        return json.dumps(self.as_dict(), ensure_ascii=False, indent=4)
+
+    def as_dict(self) -> dict:
+        result = {
             "enough": self.enough, "title": self.title_decode, "description": self.description_decode, "charset": self.charset
-        }, ensure_ascii=False, indent=4)
+        }
+        meta = {field: self._decode(value) for field, value in self.meta.items() if field not in _TITLE_FIELDS}
+        if meta:
+            result["meta"] = meta
+        if self.budget_exhausted is not None:
+            result["budget_exhausted"] = self.budget_exhausted
+            result["bytes_consumed"] = self.bytes_consumed
+        return result
 
     def __repr__(self):
         return 'Title(\n    enough=%r,\n    title=%r,\n    description=%r,\n    charset=%r\n)' % (
@@ -42,8 +96,10 @@ class Title:
         )
 
 
-@enum.unique
-class State(enum.Enum):
+class State:
+
+    # Plain integers rather than an enum, which costs a class to build at
+    # import and a slower attribute lookup and hash on every byte
 
     content = 0
     contentspace = 1
@@ -99,401 +155,1052 @@ class State(enum.Enum):
     styletagslashstyle = 87
 
 
+# The name of every State, which is also the list of them
+_STATE_NAMES = {value: name for name, value in vars(State).items() if not name.startswith('_')}
+assert len(_STATE_NAMES) == len(set(_STATE_NAMES.values()))
+
+
+# Byte order marks, which override any other charset, and the charsets of
+# UTF-16 pages without one, told apart by how the zero bytes of a '<' and of
+# the next ASCII character are placed
+_BOMS = ((b'\xef\xbb\xbf', 'UTF-8'), (b'\xff\xfe', 'UTF-16LE'), (b'\xfe\xff', 'UTF-16BE'))
+_UTF16_SNIFF = re.compile(rb'(<\x00[^\x00]\x00)|\x00<\x00[^\x00]')
+# What a page can start with and still turn out to start with either of them
+_SNIFF_PREFIX = re.compile(rb'\xef\xbb?|\xff|\xfe|<(?:\x00[^\x00]?)?|\x00(?:<\x00?)?')
+_UTF16_CODECS = {'utf-16': 'utf-16-le', 'utf-16-le': 'utf-16-le', 'utf-16-be': 'utf-16-be'}
+# Labels of the WHATWG Encoding Standard that Python does not know, or that
+# browsers decode with a superset of the charset Python would use
+_CHARSET_ALIASES = {
+    label: name for name, labels in (
+        ('utf-8', 'unicode-1-1-utf-8 unicode11utf8 unicode20utf8 x-unicode20utf8'),
+        ('cp1252', (
+            'ansi_x3.4-1968 ascii cp819 csisolatin1 ibm819 iso-8859-1 iso-ir-100 iso8859-1 iso88591 iso_8859-1 '
+            'iso_8859-1:1987 l1 latin1 us-ascii x-cp1252'
+        )),
+        ('cp1254', 'csisolatin5 iso-8859-9 iso-ir-148 iso8859-9 iso88599 iso_8859-9 iso_8859-9:1989 l5 latin5'),
+        ('cp874', 'dos-874 iso-8859-11 iso8859-11 iso885911 tis-620 windows-874'),
+        ('iso8859-8', 'csiso88598i iso-8859-8-i logical visual'),
+        ('cp932', 'csshiftjis ms932 ms_kanji shift-jis shift_jis sjis windows-31j x-sjis'),
+        ('euc_jp', 'cseucpkdfmtjapanese x-euc-jp'),
+        ('gb18030', 'chinese csgb2312 csiso58gb231280 gb2312 gb_2312 gb_2312-80 gbk iso-ir-58 x-gbk'),
+        ('cp949', 'cseuckr csksc56011987 euc-kr iso-ir-149 korean ks_c_5601-1987 ks_c_5601-1989 ksc5601 ksc_5601 windows-949'),
+        ('big5hkscs', 'big5 big5-hkscs cn-big5 csbig5 x-x-big5'),
+        ('mac-roman', 'csmacintosh mac macintosh x-mac-roman'),
+        ('mac-cyrillic', 'x-mac-cyrillic x-mac-ukrainian'),
+        ('koi8-u', 'koi8-ru'),
+    ) for label in labels.split()
+}
+
+
+# Names of the codecs for the encodings of the WHATWG Encoding Standard, the
+# only ones a page is decoded with, and not codecs like unicode_escape, idna
+# or base64 that Python also finds by name
+_WEB_CODECS = frozenset((
+    'utf-8', 'utf-16', 'utf-16-le', 'utf-16-be', 'cp866', 'iso8859-2', 'iso8859-3', 'iso8859-4', 'iso8859-5',
+    'iso8859-6', 'iso8859-7', 'iso8859-8', 'iso8859-10', 'iso8859-13', 'iso8859-14', 'iso8859-15', 'iso8859-16',
+    'koi8-r', 'koi8-u', 'mac-roman', 'mac-cyrillic', 'cp874', 'cp1250', 'cp1251', 'cp1252', 'cp1253', 'cp1254',
+    'cp1255', 'cp1256', 'cp1257', 'cp1258', 'gbk', 'gb18030', 'big5hkscs', 'euc_jp', 'iso2022_jp', 'cp932', 'cp949',
+))
+
+
+@functools.lru_cache(maxsize=256)
+def lookup_charset(label: bytes) -> [codecs.CodecInfo, None]:
+    """Return the codec to decode a page labeled with this charset, as in
+    <meta charset> or an HTTP Content-Type header, or None if it is not a
+    label of an encoding of the WHATWG Encoding Standard.
+
+    Results are cached for the few hundred most recently seen labels, as is;
+    lookup_charset.cache_info() counts the hits and misses.
+    """
+    name = label.strip().decode('UTF-8', 'replace')
+    name = _CHARSET_ALIASES.get(name.lower(), name)
+    try:
+        codec = codecs.lookup(name)
+    except (LookupError, ValueError, UnicodeError):
+        # Unknown labels, and labels with a NUL in them
+        return None
+    return codec if codec.name in _WEB_CODECS else None
+
+
+_SPACES = b'\x09\x0a\x0c\x0d\x20'
+_SPACES_RE = re.compile(rb'[\x09\x0a\x0c\x0d\x20]+')
+# Single bytes, so that any bytes-like input can be fed one byte at a time
+_BYTES = [bytes((c,)) for c in range(256)]
+# Bytes that are not delimiters in a given state are handled identically, so
+# Squeezer.feed consumes a whole run of them at once with these patterns
+_SCAN_RUNS = {
+    State.content:        re.compile(rb'[^<]+'),
+    State.contentspace:   re.compile(rb'[^<]+'),
+    State.tag:            re.compile(rb'[^\x09\x0a\x0c\x0d\x20<>!/][^\x09\x0a\x0c\x0d\x20<>/]*'),
+    State.tagname:        re.compile(rb'[^\x09\x0a\x0c\x0d\x20<>/]+'),
+    State.tagnameslash:   re.compile(rb'[^\x09\x0a\x0c\x0d\x20<>/]+'),
+    State.attrname:       re.compile(rb'[^\x09\x0a\x0c\x0d\x20<>/=]+'),
+    State.attrnameslash:  re.compile(rb'[^\x09\x0a\x0c\x0d\x20<>/=]+'),
+    State.attrvalue:      re.compile(rb'[^\x09\x0a\x0c\x0d\x20<>/"]+'),
+    State.attrquote:      re.compile(rb'[^"]+'),
+    State.attrvalueslash: re.compile(rb'[^\x09\x0a\x0c\x0d\x20<>/"]+'),
+    State.tagslash:       re.compile(rb'[^\x09\x0a\x0c\x0d\x20<>][^\x09\x0a\x0c\x0d\x20<>/]*'),
+    State.tagbang:        re.compile(rb'[^\x09\x0a\x0c\x0d\x20<>\-][^\x09\x0a\x0c\x0d\x20<>/]*'),
+    State.tagbangdash:    re.compile(rb'[^\x09\x0a\x0c\x0d\x20<>\-][^\x09\x0a\x0c\x0d\x20<>/]*'),
+    State.commentdash:    re.compile(rb'[^\-]+'),
+}
+_SCAN_RAWTEXT = {b'script': State.script, b'style': State.style}
+# Comment, script and style bodies are skipped up to the next candidate end
+# marker, found case-insensitively; bytes that may continue a partial end
+# marker are fed one by one, so an end marker that the state machine would
+# miss, or one split across feed() calls, is handled exactly as before
+_SCAN_SKIPS = {
+    State.comment: (re.compile(rb'-->'), b'->'),
+    State.script:  (re.compile(rb'</script', re.IGNORECASE), b'</SCRIPTscript'),
+    State.style:   (re.compile(rb'</style', re.IGNORECASE), b'</STYLEstyle'),
+}
+# A complete tag without unquoted slashes inside, starting at "<"
+_TAG_NAME = rb'(?:/[^\x09\x0a\x0c\x0d\x20<>]|[^\x09\x0a\x0c\x0d\x20<>!/])[^\x09\x0a\x0c\x0d\x20<>/]*'
+_TAG_ATTRS = rb'(?:[\x09\x0a\x0c\x0d\x20]+[^\x09\x0a\x0c\x0d\x20<>/=]+(?:=(?:[^\x09\x0a\x0c\x0d\x20<>/"]|"[^"]*")*)?)*'
+_SCAN_TAG = re.compile(rb'<(' + _TAG_NAME + rb')(' + _TAG_ATTRS + rb')([\x09\x0a\x0c\x0d\x20]*)(/?)>')
+_SCAN_ATTR = re.compile(
+    rb'[\x09\x0a\x0c\x0d\x20]+([^\x09\x0a\x0c\x0d\x20<>/=]+)(?:=((?:[^\x09\x0a\x0c\x0d\x20<>/"]|"[^"]*")*))?'
+)
+
+
+def _compile_inert_tags(meta_index: dict) -> re.Pattern:
+    # A pattern matching a run of tags like _SCAN_TAG does, and the content
+    # between them, where no tag can change anything but the parse state,
+    # because it is none of the tags _start_tag and _finish_tag look at, nor a
+    # tag of meta_index, and starts no script or style body. Group 1 is the
+    # last tag of the run
+    names = {b'title', b'/title', b'/head', b'body', b'meta', b'script', b'style'}.union(meta_index)
+    return re.compile(
+        rb'(?:(<(?!(?i:' + b'|'.join(re.escape(name) for name in sorted(names)) + rb')[\x09\x0a\x0c\x0d\x20/>])' +
+        _TAG_NAME + _TAG_ATTRS + rb'[\x09\x0a\x0c\x0d\x20]*/?>)[^<]*)+'
+    )
+
+
+# Which tag, with which attribute set to which value, carries which field in
+# which of its other attributes. The first match of a field wins
+META_RULES = (
+    (b'meta', b'name', b'description', 'description', b'content'),
+    (b'meta', b'property', b'og:title', 'og:title', b'content'),
+    (b'meta', b'property', b'og:description', 'og:description', b'content'),
+    (b'meta', b'property', b'og:image', 'og:image', b'content'),
+    (b'meta', b'property', b'og:site_name', 'og:site_name', b'content'),
+    (b'meta', b'name', b'theme-color', 'theme-color', b'content'),
+    (b'link', b'rel', b'canonical', 'canonical', b'href'),
+) + tuple(
+    (b'meta', attr, b'twitter:' + name, 'twitter:' + name.decode(), b'content')
+    for name in (b'card', b'site', b'creator', b'title', b'description', b'image')
+    for attr in (b'name', b'property')
+)
+# Fields Title has attributes of its own for
+_TITLE_FIELDS = ('description', 'og:title', 'og:description')
+
+
+def _compile_meta_rules(rules) -> dict:
+    # Index the rules by tag, then by attribute name, then by value, so that
+    # a tag costs one lookup per attribute name in use, whatever the number of
+    # rules
+    index = {}
+    for tag, attr, value, field, source in rules:
+        index.setdefault(tag.lower(), {}).setdefault(attr.lower(), {})[value.lower()] = (field, source.lower())
+    return index
+
+
+def _meta_attrs(meta_index: dict) -> frozenset:
+    # The attribute names _finish_tag reads, of any tag, the only ones a tag
+    # keeps in lastattrs
+    return frozenset({b'charset', b'http-equiv', b'content'}.union(*(
+        {attr}.union(source for _, source in values.values())
+        for attrs in meta_index.values()
+        for attr, values in attrs.items()
+    )))
+
+
+_META_INDEX = _compile_meta_rules(META_RULES)
+_SCAN_INERT_TAGS = _compile_inert_tags(_META_INDEX)
+_META_ATTRS = _meta_attrs(_META_INDEX)
+
+# Squeezer.getstate output starts with this, the last byte being the version
+_STATE_MAGIC = b'TSQ\x01'
+_ENGINES = ('scan', 'table', 'byte')
+# Incremental decoders a Squeezer can be transcoding UTF-16 with
+_DECODERS = (None, 'utf-16-le', 'utf-16-be')
+
+
+def _pack_varint(out: bytearray, n: int):
+    while n > 0x7f:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _pack_bytes(out: bytearray, data: [bytes, None]):
+    # Length plus one, so that None packs as a single zero byte
+    if data is None:
+        out.append(0)
+    else:
+        _pack_varint(out, len(data) + 1)
+        out += data
+
+
+class _StateReader:
+    # Unpack what _pack_varint and _pack_bytes packed
+
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data: bytes, pos: int=0):
+        self.data = bytes(data)
+        self.pos = pos
+
+    def varint(self) -> int:
+        n = 0
+        shift = 0
+        while True:
+            c = self.data[self.pos]
+            self.pos += 1
+            n |= (c & 0x7f) << shift
+            if c < 0x80:
+                return n
+            shift += 7
+
+    def bytes(self) -> [bytes, None]:
+        size = self.varint()
+        if not size:
+            return None
+        data = self.data[self.pos:self.pos+size-1]
+        if len(data) != size - 1:
+            raise ValueError('truncated Squeezer state')
+        self.pos += size - 1
+        return data
+
+    def str(self) -> [str, None]:
+        data = self.bytes()
+        return data.decode('UTF-8') if data is not None else None
+
+
 class Squeezer:
 
-    def __init__(self, default_charset='UTF-8'):
-        self.debug = False
+    __slots__ = (
+        'hook', 'profile', 'engine', 'max_title_bytes', 'max_attr_value_bytes', 'meta_index', '_inert_tags',
+        '_meta_attrs', 'required', 'max_bytes', 'deadline', 'clock', 'bytes_consumed', 'budget_exhausted', '_started',
+        'state', 'lasttag', 'lastattr', 'lastvalue', 'lastattrs',
+        'charset', 'eff_charset', '_sniff', '_decoder', 'inside_title', 'title', 'meta', 'head_done',
+        'last_result'
+    )
 
+    def __init__(
+        self, default_charset='UTF-8', engine='scan', max_title_bytes=65536, max_attr_value_bytes=65536,
+        content_type: [str, bytes, None]=None, meta_rules=None, required=('charset', 'title', 'description'),
+        max_bytes: int=0, deadline: float=0, clock=time.monotonic
+    ):
+        if engine not in ('scan', 'table', 'byte'):
+            raise ValueError('unknown engine: %r' % engine)
+        self.hook = None
+        self.profile = None
+        self.engine = engine
+        # Bytes buffered at most for the title, and for each attribute value,
+        # attribute name and tag name
+        self.max_title_bytes = max_title_bytes
+        self.max_attr_value_bytes = max_attr_value_bytes
+        # meta_rules replaces META_RULES. The result is enough once every field
+        # in required is found, where 'title' and 'description' are also found
+        # through og:title and og:description, or once the <head> is over
+        self.meta_index = _META_INDEX if meta_rules is None else _compile_meta_rules(meta_rules)
+        self._inert_tags = _SCAN_INERT_TAGS if meta_rules is None else _compile_inert_tags(self.meta_index)
+        self._meta_attrs = _META_ATTRS if meta_rules is None else _meta_attrs(self.meta_index)
+        self.required = tuple(required)
+        # Stop after max_bytes bytes, or deadline seconds after the first call
+        # to feed(), as measured by clock, like time.thread_time for CPU time
+        if not (max_bytes >= 0 and deadline >= 0):
+            raise ValueError('max_bytes and deadline must not be negative: %r, %r' % (max_bytes, deadline))
+        self.max_bytes = max_bytes
+        self.deadline = deadline
+        self.clock = clock
+        self.reset(default_charset, content_type)
+
+    def reset(self, default_charset: str='UTF-8', content_type: [str, bytes, None]=None):
+        # Forget everything fed so far, so that this Squeezer can be reused for
+        # another document without constructing a new one
         self.state = State.content
-        self.lasttag = b''
-        self.lastattr = b''
+        self.lasttag = bytearray()
+        self.lastattr = bytearray()
         self.lastvalue = None
         self.lastattrs = None
 
         self.charset = None
         self.eff_charset = default_charset
+        # The first bytes, held back until they are known not to start a byte
+        # order mark, or None once they are, and the incremental decoder that
+        # transcodes UTF-16 pages to UTF-8 before they are parsed
+        self._sniff = b''
+        self._decoder = None
         self.inside_title = False
         self.title = None
-        self.description = None
-        self.og_title = None
-        self.og_description = None
+        self.meta = {}
         self.head_done = False
+        self.last_result = None
+        self.bytes_consumed = 0
+        self.budget_exhausted = False
+        self._started = None
+        if content_type:
+            # The charset parameter of an HTTP Content-Type header, which
+            # overrides <meta> like in browsers
+            if isinstance(content_type, str):
+                content_type = content_type.encode('latin-1', 'replace')
+            for param in content_type.split(b';')[1:]:
+                key, _, value = param.partition(b'=')
+                if key.strip().lower() == b'charset':
+                    self._set_charset(value.strip().strip(b'"\''), transport=True)
+
+    @property
+    def description(self) -> [bytes, None]:
+        return self.meta.get('description')
+
+    @property
+    def og_title(self) -> [bytes, None]:
+        return self.meta.get('og:title')
+
+    @property
+    def og_description(self) -> [bytes, None]:
+        return self.meta.get('og:description')
 
     def set_debug(self, enabled: bool=True):
-        self.debug = enabled
+        self.set_hook(self._debug if enabled else None)
+
+    def set_hook(self, hook):
+        # hook(event, tag, attr, value) is called with 'start_tag', 'attr' and
+        # 'finish_tag' for every tag parsed, and with 'title' and the title
+        # when </title> ends it; nothing is formatted unless a hook is set
+        self.hook = hook
+
+    def set_profile(self, profile: ['Profile', None]):
+        # Count where feed() spends its bytes and time into profile, or stop
+        # counting with None. The counting methods live in a subclass this
+        # Squeezer is switched to, so that without a profile it runs exactly
+        # the same code as if profiling did not exist
+        if profile is not None and self.engine != 'scan':
+            raise ValueError('profiling needs the scan engine')
+        self.profile = profile
+        self.__class__ = Squeezer if profile is None else _ProfiledSqueezer
+        if profile is not None:
+            profile.offsets = None
+
+    def getstate(self) -> bytes:
+        """Pack everything this Squeezer knows about the document fed so far
+        into usually a few hundred bytes, bounded by max_title_bytes,
+        max_attr_value_bytes and the number of meta rules, which from_state
+        turns back into a Squeezer that continues where this one stopped, in
+        this process or in another one.
+
+        The hook, the profile and the clock are not packed, and a deadline is
+        measured again from the first feed() of the restored Squeezer.
+        """
+        out = bytearray(_STATE_MAGIC)
+        flags = (
+            self.inside_title | self.head_done << 1 | self.budget_exhausted << 2 |
+            (self.meta_index is not _META_INDEX) << 3
+        )
+        _pack_varint(out, flags)
+        _pack_varint(out, self.state)
+        _pack_varint(out, _ENGINES.index(self.engine))
+        for n in (self.max_title_bytes, self.max_attr_value_bytes, self.max_bytes, self.bytes_consumed):
+            _pack_varint(out, n)
+        out += struct.pack('<d', self.deadline)
+        for data in (self.lasttag, self.lastattr, self.lastvalue, self.title, self._sniff):
+            _pack_bytes(out, data)
+        for text in (self.charset, self.eff_charset):
+            _pack_bytes(out, text.encode('UTF-8') if text is not None else None)
+        if self._decoder is None:
+            out.append(0)
+        else:
+            _pack_varint(out, next(
+                i for i, name in enumerate(_DECODERS) if name and isinstance(self._decoder, codecs.getincrementaldecoder(name))
+            ))
+            buffered, decoder_flags = self._decoder.getstate()
+            _pack_bytes(out, buffered)
+            _pack_varint(out, decoder_flags)
+        _pack_varint(out, len(self.required))
+        for field in self.required:
+            _pack_bytes(out, field.encode('UTF-8'))
+        if self.lastattrs is None:
+            out.append(0)
+        else:
+            _pack_varint(out, len(self.lastattrs) + 1)
+            for attr, value in self.lastattrs.items():
+                _pack_bytes(out, attr)
+                _pack_bytes(out, value)
+        _pack_varint(out, len(self.meta))
+        for field, value in self.meta.items():
+            _pack_bytes(out, field.encode('UTF-8'))
+            _pack_bytes(out, value)
+        if self.meta_index is not _META_INDEX:
+            rules = [
+                (tag, attr, value, field, source)
+                for tag, attrs in self.meta_index.items()
+                for attr, values in attrs.items()
+                for value, (field, source) in values.items()
+            ]
+            _pack_varint(out, len(rules))
+            for tag, attr, value, field, source in rules:
+                for data in (tag, attr, value, field.encode('UTF-8'), source):
+                    _pack_bytes(out, data)
+        return bytes(out)
+
+    @classmethod
+    def from_state(cls, state: bytes, clock=time.monotonic) -> 'Squeezer':
+        """Restore a Squeezer from what getstate returned."""
+        reader = _StateReader(state, len(_STATE_MAGIC))
+        if reader.data[:len(_STATE_MAGIC)] != _STATE_MAGIC:
+            raise ValueError('not a Squeezer state')
+        self = cls.__new__(cls)
+        self.hook = None
+        self.profile = None
+        self.clock = clock
+        self._started = None
+        self.last_result = None
+        try:
+            flags = reader.varint()
+            self.state = reader.varint()
+            if self.state not in _STATE_NAMES:
+                raise KeyError(self.state)
+            self.engine = _ENGINES[reader.varint()]
+            self.max_title_bytes = reader.varint()
+            self.max_attr_value_bytes = reader.varint()
+            self.max_bytes = reader.varint()
+            self.bytes_consumed = reader.varint()
+            self.deadline, = struct.unpack_from('<d', reader.data, reader.pos)
+            reader.pos += 8
+            self.inside_title = bool(flags & 1)
+            self.head_done = bool(flags & 2)
+            self.budget_exhausted = bool(flags & 4)
+            self.lasttag = bytearray(reader.bytes() or b'')
+            self.lastattr = bytearray(reader.bytes() or b'')
+            lastvalue = reader.bytes()
+            self.lastvalue = bytearray(lastvalue) if lastvalue is not None else None
+            title = reader.bytes()
+            self.title = bytearray(title) if title is not None else None
+            self._sniff = reader.bytes()
+            self.charset = reader.str()
+            self.eff_charset = reader.str()
+            decoder = _DECODERS[reader.varint()]
+            if decoder is None:
+                self._decoder = None
+            else:
+                self._decoder = codecs.getincrementaldecoder(decoder)('replace')
+                self._decoder.setstate((reader.bytes() or b'', reader.varint()))
+            self.required = tuple(reader.str() for _ in range(reader.varint()))
+            count = reader.varint()
+            self.lastattrs = {reader.bytes(): reader.bytes() for _ in range(count - 1)} if count else None
+            self.meta = {reader.str(): reader.bytes() for _ in range(reader.varint())}
+            if flags & 8:
+                self.meta_index = _compile_meta_rules(
+                    (reader.bytes(), reader.bytes(), reader.bytes(), reader.str(), reader.bytes())
+                    for _ in range(reader.varint())
+                )
+                self._inert_tags = _compile_inert_tags(self.meta_index)
+                self._meta_attrs = _meta_attrs(self.meta_index)
+            else:
+                self.meta_index = _META_INDEX
+                self._inert_tags = _SCAN_INERT_TAGS
+                self._meta_attrs = _META_ATTRS
+        except (IndexError, KeyError, struct.error, UnicodeDecodeError) as e:
+            raise ValueError('bad Squeezer state: %s' % e) from None
+        return self
+
+    def __reduce__(self):
+        # Pickle through getstate, also for the profiled subclass
+        return Squeezer.from_state, (self.getstate(),)
+
+    def feed(self, data: bytes=b'', final: bool=False) -> Title:
+        # final tells that data is the last of the document, so that bytes held
+        # back to sniff a byte order mark or to decode UTF-16 are fed as well.
+        # An empty data does not, since a decompressor may produce nothing for
+        # some of what it is given
+        if self.max_bytes or self.deadline:
+            data = self._within_budget(data)
+        self.bytes_consumed += len(data)
+        if self._sniff is not None:
+            data = self._sniff_bom(data, final)
+        if self._decoder is not None:
+            data = self._decoder.decode(data, final).encode('UTF-8')
+        if self.engine == 'scan':
+            self._feed_scan(data)
+        elif self.engine == 'table':
+            self._feed_table(data)
+        else:
+            # The reference state machine, one byte at a time
+            for c in data:
+                self._feed_byte(_BYTES[c])
+
+        enough = self._is_enough()
+        title = self.og_title or self.title
+        description = self.og_description or self.description
+        # A result is only reused while nothing it reports has changed, which
+        # with a budget includes the bytes consumed
+        if self.max_bytes or self.deadline:
+            budget_exhausted = self.budget_exhausted
+            bytes_consumed = self.bytes_consumed
+        else:
+            budget_exhausted = None
+            bytes_consumed = 0
+        result = self.last_result
+        if (
+            result is None or result.enough != enough or
+            result.title != title or result.description is not description or
+            result.charset != self.charset or result.eff_charset != self.eff_charset or
+            len(result.meta) != len(self.meta) or result.budget_exhausted is not budget_exhausted or
+            result.bytes_consumed != bytes_consumed
+        ):
+            if title is not None:
+                title = bytes(title)
+            result = self.last_result = Title(
+                enough, title, description, self.charset, self.eff_charset, dict(self.meta), budget_exhausted,
+                bytes_consumed
+            )
+        return result
+
+    def _within_budget(self, data: bytes) -> bytes:
+        # Return what can still be fed of data
+        if self.budget_exhausted:
+            return b''
+        if self.deadline:
+            now = self.clock()
+            if self._started is None:
+                self._started = now
+            elif now - self._started >= self.deadline:
+                self.budget_exhausted = True
+                return b''
+        if self.max_bytes and self.bytes_consumed + len(data) > self.max_bytes:
+            self.budget_exhausted = True
+            return data[:self.max_bytes - self.bytes_consumed]
+        return data
+
+    def _sniff_bom(self, data: bytes, final: bool) -> bytes:
+        if self._sniff:
+            data = self._sniff + bytes(data)
+        if not final and _SNIFF_PREFIX.fullmatch(data):
+            # Too short to tell yet, unless this is the last call
+            self._sniff = bytes(data)
+            return b''
+        self._sniff = None
+        for bom, charset in _BOMS:
+            if data[:len(bom)] == bom:
+                self._set_charset(charset.encode(), transport=True)
+                return data[len(bom):]
+        if self.charset is None:
+            m = _UTF16_SNIFF.match(data)
+            if m:
+                self._set_charset(b'UTF-16LE' if m.group(1) else b'UTF-16BE', transport=True)
+        return data
+
+    def _feed_scan(self, data: bytes):
+        # Every step goes through one of _feed_run, _feed_skip, _feed_tags and
+        # _feed_scan_byte, which _ProfiledSqueezer times
+        pos = 0
+        end = len(data)
+        while pos < end:
+            run = _SCAN_RUNS.get(self.state)
+            if run is not None:
+                m = run.match(data, pos)
+                if m is not None:
+                    self._feed_run(m.group())
+                    pos = m.end()
+                    if pos == end:
+                        break
+            elif self.state in _SCAN_SKIPS:
+                pos = self._feed_skip(data, pos)
+                continue
+            if self.state == State.content or self.state == State.contentspace:
+                stop = self._feed_tags(data, pos)
+                if stop != pos:
+                    pos = stop
+                    continue
+            self._feed_scan_byte(_BYTES[data[pos]])
+            pos += 1
 
-    def feed(self, data: bytes=b'') -> Title:
+    def _feed_table(self, data: bytes):
+        states, index, next_states, actions, handlers = _TABLE or _load_table()
+        state = index[self.state]
         for c in data:
-            c = bytes((c,))
-
-            if self.state == State.content:
-                if self._isspace(c):
-                    self._dispatch_content(b'\x20')
-                    self.state = State.contentspace
-                elif c == b'<':
-                    self.lasttag = b''
-                    self.lastattr = b''
-                    self.lastvalue = None
-                    self.state = State.tag
-                else:
-                    self._dispatch_content(c)
+            i = state << 8 | c
+            state = next_states[i]
+            action = actions[i]
+            if action:
+                next_state = handlers[action](self, c)
+                if next_state is not None:
+                    state = next_state
+        self.state = states[state]
 
-            elif self.state == State.contentspace:
-                if self._isspace(c):
-                    pass
-                elif c == b'<':
-                    self.lasttag = b''
-                    self.lastattr = b''
-                    self.lastvalue = None
-                    self.state = State.tag
-                else:
-                    self._dispatch_content(c)
-                    self.state = State.content
+    def _feed_run(self, run: bytes):
+        # Bulk equivalent of feeding every byte of run to _feed_byte, where
+        # run only contains bytes that are not delimiters in self.state
+        if self.state == State.content or self.state == State.contentspace:
+            if self.inside_title:
+                content = _SPACES_RE.sub(b'\x20', run)
+                if self.state == State.contentspace and content[:1] == b'\x20':
+                    content = content[1:]
+                if content:
+                    self._dispatch_content(content)
+            if run[-1] in _SPACES:
+                self.state = State.contentspace
+            else:
+                self.state = State.content
 
-            elif self.state == State.tag:
-                if self._isspace(c):
-                    self._dispatch_content(b'&lt;' + c)
-                    self.state = State.content
-                elif c == b'<':
-                    self._dispatch_content(b'&lt;')
-                elif c == b'>':
-                    self._dispatch_content(b'&lt;&gt;')
-                    self.state = State.content
-                elif c == b'!':
-                    self.state = State.tagbang
-                elif c == b'/':
-                    self.state = State.tagslash
-                else:
-                    self.lasttag = c
-                    self.state = State.tagname
-
-            elif self.state == State.tagname:
-                if self._isspace(c):
-                    self._start_tag(self.lasttag)
-                    self.state = State.attrname
-                elif c == b'<':
-                    self._start_tag(self.lasttag)
-                    self.lasttag = b''
-                    self.state = State.tag
-                elif c == b'>':
-                    self._start_tag(self.lasttag)
-                    self._finish_tag(self.lasttag)
-                    if self.lasttag.lower() == b'script':
-                        self.state = State.script
-                    elif self.lasttag.lower() == b'style':
-                        self.state = State.style
-                    else:
-                        self.state = State.content
-                elif c == b'/':
-                    self.state = State.tagnameslash
-                else:
-                    self.lasttag += c
-
-            elif self.state == State.tagnameslash:
-                if self._isspace(c):
-                    self.lasttag += b'/'
-                    self._start_tag(self.lasttag)
-                    self.state = State.attrname
-                elif c == b'<':
-                    self._start_tag(self.lasttag)
-                    self.lasttag = b''
-                    self.state = State.tag
-                elif c == b'>':
-                    self._start_tag(self.lasttag)
-                    self._finish_tag(self.lasttag)
-                    self.state = State.content
-                elif c == b'/':
-                    self.lasttag += b'/'
-                else:
-                    self.lasttag += c
-                    self.state = State.tagname
-
-            elif self.state == State.attrname:
-                if self._isspace(c):
-                    self._dispatch_attr(self.lasttag, self.lastattr)
-                    self.lastattr = b''
-                    self.lastvalue = None
-                elif c == b'<':
-                    self._dispatch_attr(self.lasttag, self.lastattr)
-                    self.lasttag = b''
-                    self.lastattr = b''
-                    self.lastvalue = None
-                    self.state = State.tag
-                elif c == b'>':
-                    self._dispatch_attr(self.lasttag, self.lastattr)
-                    self._finish_tag(self.lasttag)
-                    if self.lasttag.lower() == b'script':
-                        self.state = State.script
-                    elif self.lasttag.lower() == b'style':
-                        self.state = State.style
-                    else:
-                        self.state = State.content
-                elif c == b'/':
-                    self.state = State.attrnameslash
-                elif c == b'=':
-                    self.lastvalue = b''
-                    self.state = State.attrvalue
-                else:
-                    self.lastattr += c
-
-            elif self.state == State.attrnameslash:
-                if self._isspace(c):
-                    self.lastattr += b'/'
-                    self._dispatch_attr(self.lasttag, self.lastattr)
-                    self.lastattr = b''
-                    self.lastvalue = None
-                elif c == b'<':
-                    self._dispatch_attr(self.lasttag, self.lastattr)
-                    self.lasttag = b''
-                    self.lastattr = b''
-                    self.lastvalue = None
-                    self.state = State.tag
-                elif c == b'>':
-                    self._dispatch_attr(self.lasttag, self.lastattr)
-                    self._finish_tag(self.lasttag)
-                    self.state = State.content
-                elif c == b'/':
-                    self.lastattr += b'/'
-                elif c == b'=':
-                    self.lastvalue = b''
-                    self.state = State.attrvalue
-                else:
-                    self.lastattr += c
-                    self.state = State.attrname
-
-            elif self.state == State.attrvalue:
-                if self._isspace(c):
-                    self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
-                    self.lastattr = b''
-                    self.lastvalue = None
-                    self.state = State.attrname
-                elif c == b'<':
-                    self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
-                    self.lasttag = b''
-                    self.lastattr = b''
-                    self.lastvalue = None
-                    self.state = State.tag
-                elif c == b'>':
-                    self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
-                    self._finish_tag(self.lasttag)
-                    if self.lasttag.lower() == b'script':
-                        self.state = State.script
-                    elif self.lasttag.lower() == b'style':
-                        self.state = State.style
-                    else:
-                        self.state = State.content
-                elif c == b'/':
-                    self.state = State.attrvalueslash
-                elif c == b'"':
-                    self.state = State.attrquote
-                else:
-                    self.lastvalue += c
+        elif self.state == State.tag:
+            self.lasttag = bytearray(run[:self.max_attr_value_bytes])
+            self.state = State.tagname
+        elif self.state == State.tagname:
+            self._append(self.lasttag, run, self.max_attr_value_bytes)
+        elif self.state == State.tagnameslash:
+            self._append(self.lasttag, run, self.max_attr_value_bytes)
+            self.state = State.tagname
 
-            elif self.state == State.attrquote:
-                if c == b'"':
-                    self.state = State.attrvalue
-                else:
-                    self.lastvalue += c
-
-            elif self.state == State.attrvalueslash:
-                if self._isspace(c):
-                    self.lastvalue += b'/'
-                    self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
-                    self.lastattr = b''
-                    self.lastvalue = None
-                    self.state = State.attrname
-                elif c == b'<':
-                    self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
-                    self.lasttag = b''
-                    self.lastattr = b''
-                    self.lastvalue = None
-                    self.state = State.tag
-                elif c == b'>':
-                    self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
-                    self._finish_tag(self.lasttag)
-                    if self.lasttag.lower() == b'script':
-                        self.state = State.script
-                    elif self.lasttag.lower() == b'style':
-                        self.state = State.style
-                    else:
-                        self.state = State.content
-                elif c == b'/':
-                    self.lastvalue += b'/'
-                elif c == b'"':
-                    self.state = State.attrquote
-                else:
-                    self.lastvalue += c
-                    self.state = State.attrvalue
-
-            elif self.state == State.tagslash:
-                if self._isspace(c):
-                    self.lasttag = b'/'
-                    self._start_tag(self.lasttag)
-                    self.state = State.attrname
-                elif c == b'<':
-                    self._dispatch_content(b'&lt;/')
-                    self.state = State.tag
-                elif c == b'>':
-                    self.lasttag = b'/'
-                    self._start_tag(self.lasttag)
-                    self._finish_tag(self.lasttag)
-                    self.state = State.content
-                else:
-                    self.lasttag = b'/' + c
-                    self.state = State.tagname
-
-            elif self.state == State.tagbang:
-                if self._isspace(c):
-                    self.lasttag = b'!'
-                    self._start_tag(self.lasttag)
-                    self.state = State.attrname
-                elif c == b'<':
-                    self._dispatch_content(b'&lt;!')
-                    self.state = State.tag
-                elif c == b'>':
-                    self.lasttag = b'!'
-                    self._start_tag(self.lasttag)
-                    self._finish_tag(self.lasttag)
-                    self.state = State.content
-                elif c == b'-':
-                    self.state = State.tagbangdash
-                else:
-                    self.lasttag = b'!' + c
-                    self.state = State.tagname
-
-            elif self.state == State.tagbangdash:
-                if self._isspace(c):
-                    self.lasttag = b'!-'
-                    self._start_tag(self.lasttag)
-                    self.state = State.attrname
-                elif c == b'<':
-                    self._dispatch_content(b'&lt;!-')
-                    self.state = State.tag
-                elif c == b'>':
-                    self.lasttag = b'!-'
-                    self._start_tag(self.lasttag)
-                    self._finish_tag(self.lasttag)
-                    self.state = State.content
-                elif c == b'-':
-                    self.state = State.comment
-                else:
-                    self.lasttag = b'!-' + c
-                    self.state = State.tagname
-
-            elif self.state == State.comment:
-                if c == b'-':
-                    self.state = State.commentdash
-            elif self.state == State.commentdash:
-                if c == b'-':
-                    self.state = State.commentdashdash
-                else:
-                    self.state = State.comment
-            elif self.state == State.commentdashdash:
-                if c == b'>':
-                    self.state = State.content
-                else:
-                    self.state = State.comment
-
-            elif self.state == State.script:
-                if c == b'<':
-                    self.state = State.scripttag
-            elif self.state == State.scripttag:
-                if c == b'/':
-                    self.state = State.scripttagslash
-                else:
-                    self.state = State.script
-            elif self.state == State.scripttagslash:
-                if c in (b'S', b's'):
-                    self.state = State.scripttagslashs
-                else:
-                    self.state = State.script
-            elif self.state == State.scripttagslashs:
-                if c in (b'C', b'c'):
-                    self.state = State.scripttagslashsc
-                else:
-                    self.state = State.script
-            elif self.state == State.scripttagslashsc:
-                if c in (b'R', b'r'):
-                    self.state = State.scripttagslashscr
-                else:
-                    self.state = State.script
-            elif self.state == State.scripttagslashscr:
-                if c in (b'I', b'i'):
-                    self.state = State.scripttagslashscri
-                else:
-                    self.state = State.script
-            elif self.state == State.scripttagslashscri:
-                if c in (b'P', b'p'):
-                    self.state = State.scripttagslashscrip
-                else:
+        elif self.state == State.attrname:
+            self._append(self.lastattr, run, self.max_attr_value_bytes)
+        elif self.state == State.attrnameslash:
+            self._append(self.lastattr, run, self.max_attr_value_bytes)
+            self.state = State.attrname
+
+        elif self.state == State.attrvalue or self.state == State.attrquote:
+            self._append(self.lastvalue, run, self.max_attr_value_bytes)
+        elif self.state == State.attrvalueslash:
+            self._append(self.lastvalue, run, self.max_attr_value_bytes)
+            self.state = State.attrvalue
+
+        elif self.state == State.tagslash:
+            self.lasttag = bytearray((b'/' + run)[:self.max_attr_value_bytes])
+            self.state = State.tagname
+        elif self.state == State.tagbang:
+            self.lasttag = bytearray((b'!' + run)[:self.max_attr_value_bytes])
+            self.state = State.tagname
+        elif self.state == State.tagbangdash:
+            self.lasttag = bytearray((b'!-' + run)[:self.max_attr_value_bytes])
+            self.state = State.tagname
+
+        elif self.state == State.commentdash:
+            self.state = State.comment
+
+    def _feed_skip(self, data: bytes, pos: int) -> int:
+        # Skip the comment, script or style body starting at pos, and return
+        # the position the caller should continue from
+        marker, partial = _SCAN_SKIPS[self.state]
+        m = marker.search(data, pos)
+        stop = m.end() if m is not None else len(data)
+        # Any byte that can not be part of a marker resets the state machine
+        # back to self.state, so only the bytes after it need to be fed
+        sync = m.start() if m is not None else len(data)
+        while sync > pos and data[sync-1] in partial:
+            sync -= 1
+        for i in range(sync, stop):
+            self._feed_byte(_BYTES[data[i]])
+        return stop
+
+    def _feed_tags(self, data: bytes, pos: int) -> int:
+        # Feed the tag starting at pos in State.content, and return the
+        # position after it, or pos if there is none
+        if not self.inside_title and self.hook is None and self.max_attr_value_bytes > 6:
+            # Content outside the title is dropped and inert tags only matter
+            # for the state they leave behind, so jump to the last one of a
+            # run, always a tag _SCAN_TAG matches, and feed just that one
+            m = self._inert_tags.match(data, pos)
+            if m is not None:
+                pos = m.start(1)
+                self.state = State.content
+        m = _SCAN_TAG.match(data, pos)
+        if m is None:
+            return pos
+        self._feed_tag(m)
+        return m.end()
+
+    def _feed_tag(self, m: re.Match):
+        # Bulk equivalent of feeding a whole tag matched by _SCAN_TAG to
+        # _feed_byte, starting from State.content
+        tag, attrs, trailing, slash = m.group(1, 2, 3, 4)
+        tag = tag[:self.max_attr_value_bytes]
+        self.lasttag = bytearray(tag)
+        self.lastattr = bytearray()
+        self.lastvalue = None
+        self._start_tag(tag)
+        for attr in _SCAN_ATTR.finditer(attrs):
+            name, value = attr.group(1, 2)
+            self.lastattr = bytearray(name[:self.max_attr_value_bytes])
+            if value is not None:
+                self.lastvalue = bytearray(value.replace(b'"', b'')[:self.max_attr_value_bytes])
+            else:
+                self.lastvalue = None
+            self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
+        if trailing:
+            self.lastattr = bytearray()
+            self.lastvalue = None
+        self._finish_tag(tag)
+        if slash and self.lastvalue is None:
+            self.state = State.content
+        else:
+            self.state = _SCAN_RAWTEXT.get(tag.lower(), State.content)
+
+    def _feed_byte(self, c: bytes):
+        if self.state == State.content:
+            if self._isspace(c):
+                self._dispatch_content(b'\x20')
+                self.state = State.contentspace
+            elif c == b'<':
+                self.lasttag = bytearray()
+                self.lastattr = bytearray()
+                self.lastvalue = None
+                self.state = State.tag
+            else:
+                self._dispatch_content(c)
+
+        elif self.state == State.contentspace:
+            if self._isspace(c):
+                pass
+            elif c == b'<':
+                self.lasttag = bytearray()
+                self.lastattr = bytearray()
+                self.lastvalue = None
+                self.state = State.tag
+            else:
+                self._dispatch_content(c)
+                self.state = State.content
+
+        elif self.state == State.tag:
+            if self._isspace(c):
+                self._dispatch_content(b'&lt;' + c)
+                self.state = State.content
+            elif c == b'<':
+                self._dispatch_content(b'&lt;')
+            elif c == b'>':
+                self._dispatch_content(b'&lt;&gt;')
+                self.state = State.content
+            elif c == b'!':
+                self.state = State.tagbang
+            elif c == b'/':
+                self.state = State.tagslash
+            else:
+                self.lasttag = bytearray(c)
+                self.state = State.tagname
+
+        elif self.state == State.tagname:
+            if self._isspace(c):
+                self._start_tag(self.lasttag)
+                self.state = State.attrname
+            elif c == b'<':
+                self._start_tag(self.lasttag)
+                self.lasttag = bytearray()
+                self.state = State.tag
+            elif c == b'>':
+                self._start_tag(self.lasttag)
+                self._finish_tag(self.lasttag)
+                if self.lasttag.lower() == b'script':
                     self.state = State.script
-            elif self.state == State.scripttagslashscrip:
-                if c in (b'T', b't'):
-                    self.state = State.scripttagslashscript
+                elif self.lasttag.lower() == b'style':
+                    self.state = State.style
                 else:
-                    self.state = State.script
-            elif self.state == State.scripttagslashscript:
-                if self._isspace(c):
-                    pass
-                elif c == b'>':
-                    self.lasttag = b'/script'
-                    self._start_tag(self.lasttag)
-                    self._finish_tag(self.lasttag)
                     self.state = State.content
-                else:
-                    self.state = State.script
+            elif c == b'/':
+                self.state = State.tagnameslash
+            else:
+                self._append(self.lasttag, c, self.max_attr_value_bytes)
 
-            elif self.state == State.style:
-                if c == b'<':
-                    self.state = State.styletag
-            elif self.state == State.styletag:
-                if c == b'/':
-                    self.state = State.styletagslash
-                else:
-                    self.state = State.style
-            elif self.state == State.styletagslash:
-                if c in (b'S', b's'):
-                    self.state = State.styletagslashs
-                else:
-                    self.state = State.style
-            elif self.state == State.styletagslashs:
-                if c in (b'T', b't'):
-                    self.state = State.styletagslashst
-                else:
+        elif self.state == State.tagnameslash:
+            if self._isspace(c):
+                self._append(self.lasttag, b'/', self.max_attr_value_bytes)
+                self._start_tag(self.lasttag)
+                self.state = State.attrname
+            elif c == b'<':
+                self._start_tag(self.lasttag)
+                self.lasttag = bytearray()
+                self.state = State.tag
+            elif c == b'>':
+                self._start_tag(self.lasttag)
+                self._finish_tag(self.lasttag)
+                self.state = State.content
+            elif c == b'/':
+                self._append(self.lasttag, b'/', self.max_attr_value_bytes)
+            else:
+                self._append(self.lasttag, c, self.max_attr_value_bytes)
+                self.state = State.tagname
+
+        elif self.state == State.attrname:
+            if self._isspace(c):
+                self._dispatch_attr(self.lasttag, self.lastattr)
+                self.lastattr = bytearray()
+                self.lastvalue = None
+            elif c == b'<':
+                self._dispatch_attr(self.lasttag, self.lastattr)
+                self.lasttag = bytearray()
+                self.lastattr = bytearray()
+                self.lastvalue = None
+                self.state = State.tag
+            elif c == b'>':
+                self._dispatch_attr(self.lasttag, self.lastattr)
+                self._finish_tag(self.lasttag)
+                if self.lasttag.lower() == b'script':
+                    self.state = State.script
+                elif self.lasttag.lower() == b'style':
                     self.state = State.style
-            elif self.state == State.styletagslashst:
-                if c in (b'Y', b'y'):
-                    self.state = State.styletagslashsty
                 else:
+                    self.state = State.content
+            elif c == b'/':
+                self.state = State.attrnameslash
+            elif c == b'=':
+                self.lastvalue = bytearray()
+                self.state = State.attrvalue
+            else:
+                self._append(self.lastattr, c, self.max_attr_value_bytes)
+
+        elif self.state == State.attrnameslash:
+            if self._isspace(c):
+                self._append(self.lastattr, b'/', self.max_attr_value_bytes)
+                self._dispatch_attr(self.lasttag, self.lastattr)
+                self.lastattr = bytearray()
+                self.lastvalue = None
+            elif c == b'<':
+                self._dispatch_attr(self.lasttag, self.lastattr)
+                self.lasttag = bytearray()
+                self.lastattr = bytearray()
+                self.lastvalue = None
+                self.state = State.tag
+            elif c == b'>':
+                self._dispatch_attr(self.lasttag, self.lastattr)
+                self._finish_tag(self.lasttag)
+                self.state = State.content
+            elif c == b'/':
+                self._append(self.lastattr, b'/', self.max_attr_value_bytes)
+            elif c == b'=':
+                self.lastvalue = bytearray()
+                self.state = State.attrvalue
+            else:
+                self._append(self.lastattr, c, self.max_attr_value_bytes)
+                self.state = State.attrname
+
+        elif self.state == State.attrvalue:
+            if self._isspace(c):
+                self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
+                self.lastattr = bytearray()
+                self.lastvalue = None
+                self.state = State.attrname
+            elif c == b'<':
+                self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
+                self.lasttag = bytearray()
+                self.lastattr = bytearray()
+                self.lastvalue = None
+                self.state = State.tag
+            elif c == b'>':
+                self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
+                self._finish_tag(self.lasttag)
+                if self.lasttag.lower() == b'script':
+                    self.state = State.script
+                elif self.lasttag.lower() == b'style':
                     self.state = State.style
-            elif self.state == State.styletagslashsty:
-                if c in (b'L', b'l'):
-                    self.state = State.styletagslashstyl
                 else:
+                    self.state = State.content
+            elif c == b'/':
+                self.state = State.attrvalueslash
+            elif c == b'"':
+                self.state = State.attrquote
+            else:
+                self._append(self.lastvalue, c, self.max_attr_value_bytes)
+
+        elif self.state == State.attrquote:
+            if c == b'"':
+                self.state = State.attrvalue
+            else:
+                self._append(self.lastvalue, c, self.max_attr_value_bytes)
+
+        elif self.state == State.attrvalueslash:
+            if self._isspace(c):
+                self._append(self.lastvalue, b'/', self.max_attr_value_bytes)
+                self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
+                self.lastattr = bytearray()
+                self.lastvalue = None
+                self.state = State.attrname
+            elif c == b'<':
+                self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
+                self.lasttag = bytearray()
+                self.lastattr = bytearray()
+                self.lastvalue = None
+                self.state = State.tag
+            elif c == b'>':
+                self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
+                self._finish_tag(self.lasttag)
+                if self.lasttag.lower() == b'script':
+                    self.state = State.script
+                elif self.lasttag.lower() == b'style':
                     self.state = State.style
-            elif self.state == State.styletagslashstyl:
-                if c in (b'E', b'e'):
-                    self.state = State.styletagslashstyle
                 else:
-                    self.state = State.style
-            elif self.state == State.styletagslashstyle:
-                if self._isspace(c):
-                    pass
-                elif c == b'>':
-                    self.lasttag = b'/style'
-                    self._start_tag(self.lasttag)
-                    self._finish_tag(self.lasttag)
                     self.state = State.content
-                else:
-                    self.state = State.style
+            elif c == b'/':
+                self._append(self.lastvalue, b'/', self.max_attr_value_bytes)
+            elif c == b'"':
+                self.state = State.attrquote
+            else:
+                self._append(self.lastvalue, c, self.max_attr_value_bytes)
+                self.state = State.attrvalue
 
-        return Title(
-            self._is_enough(),
-            self.og_title or self.title,
-            self.og_description or self.description,
-            self.charset,
-            self.eff_charset
-        )
+        elif self.state == State.tagslash:
+            if self._isspace(c):
+                self.lasttag = bytearray(b'/')
+                self._start_tag(self.lasttag)
+                self.state = State.attrname
+            elif c == b'<':
+                self._dispatch_content(b'&lt;/')
+                self.state = State.tag
+            elif c == b'>':
+                self.lasttag = bytearray(b'/')
+                self._start_tag(self.lasttag)
+                self._finish_tag(self.lasttag)
+                self.state = State.content
+            else:
+                self.lasttag = bytearray((b'/' + c)[:self.max_attr_value_bytes])
+                self.state = State.tagname
+
+        elif self.state == State.tagbang:
+            if self._isspace(c):
+                self.lasttag = bytearray(b'!')
+                self._start_tag(self.lasttag)
+                self.state = State.attrname
+            elif c == b'<':
+                self._dispatch_content(b'&lt;!')
+                self.state = State.tag
+            elif c == b'>':
+                self.lasttag = bytearray(b'!')
+                self._start_tag(self.lasttag)
+                self._finish_tag(self.lasttag)
+                self.state = State.content
+            elif c == b'-':
+                self.state = State.tagbangdash
+            else:
+                self.lasttag = bytearray((b'!' + c)[:self.max_attr_value_bytes])
+                self.state = State.tagname
+
+        elif self.state == State.tagbangdash:
+            if self._isspace(c):
+                self.lasttag = bytearray(b'!-')
+                self._start_tag(self.lasttag)
+                self.state = State.attrname
+            elif c == b'<':
+                self._dispatch_content(b'&lt;!-')
+                self.state = State.tag
+            elif c == b'>':
+                self.lasttag = bytearray(b'!-')
+                self._start_tag(self.lasttag)
+                self._finish_tag(self.lasttag)
+                self.state = State.content
+            elif c == b'-':
+                self.state = State.comment
+            else:
+                self.lasttag = bytearray((b'!-' + c)[:self.max_attr_value_bytes])
+                self.state = State.tagname
+
+        elif self.state == State.comment:
+            if c == b'-':
+                self.state = State.commentdash
+        elif self.state == State.commentdash:
+            if c == b'-':
+                self.state = State.commentdashdash
+            else:
+                self.state = State.comment
+        elif self.state == State.commentdashdash:
+            if c == b'>':
+                self.state = State.content
+            else:
+                self.state = State.comment
+
+        elif self.state == State.script:
+            if c == b'<':
+                self.state = State.scripttag
+        elif self.state == State.scripttag:
+            if c == b'/':
+                self.state = State.scripttagslash
+            else:
+                self.state = State.script
+        elif self.state == State.scripttagslash:
+            if c in (b'S', b's'):
+                self.state = State.scripttagslashs
+            else:
+                self.state = State.script
+        elif self.state == State.scripttagslashs:
+            if c in (b'C', b'c'):
+                self.state = State.scripttagslashsc
+            else:
+                self.state = State.script
+        elif self.state == State.scripttagslashsc:
+            if c in (b'R', b'r'):
+                self.state = State.scripttagslashscr
+            else:
+                self.state = State.script
+        elif self.state == State.scripttagslashscr:
+            if c in (b'I', b'i'):
+                self.state = State.scripttagslashscri
+            else:
+                self.state = State.script
+        elif self.state == State.scripttagslashscri:
+            if c in (b'P', b'p'):
+                self.state = State.scripttagslashscrip
+            else:
+                self.state = State.script
+        elif self.state == State.scripttagslashscrip:
+            if c in (b'T', b't'):
+                self.state = State.scripttagslashscript
+            else:
+                self.state = State.script
+        elif self.state == State.scripttagslashscript:
+            if self._isspace(c):
+                pass
+            elif c == b'>':
+                self.lasttag = bytearray(b'/script')
+                self._start_tag(self.lasttag)
+                self._finish_tag(self.lasttag)
+                self.state = State.content
+            else:
+                self.state = State.script
+
+        elif self.state == State.style:
+            if c == b'<':
+                self.state = State.styletag
+        elif self.state == State.styletag:
+            if c == b'/':
+                self.state = State.styletagslash
+            else:
+                self.state = State.style
+        elif self.state == State.styletagslash:
+            if c in (b'S', b's'):
+                self.state = State.styletagslashs
+            else:
+                self.state = State.style
+        elif self.state == State.styletagslashs:
+            if c in (b'T', b't'):
+                self.state = State.styletagslashst
+            else:
+                self.state = State.style
+        elif self.state == State.styletagslashst:
+            if c in (b'Y', b'y'):
+                self.state = State.styletagslashsty
+            else:
+                self.state = State.style
+        elif self.state == State.styletagslashsty:
+            if c in (b'L', b'l'):
+                self.state = State.styletagslashstyl
+            else:
+                self.state = State.style
+        elif self.state == State.styletagslashstyl:
+            if c in (b'E', b'e'):
+                self.state = State.styletagslashstyle
+            else:
+                self.state = State.style
+        elif self.state == State.styletagslashstyle:
+            if self._isspace(c):
+                pass
+            elif c == b'>':
+                self.lasttag = bytearray(b'/style')
+                self._start_tag(self.lasttag)
+                self._finish_tag(self.lasttag)
+                self.state = State.content
+            else:
+                self.state = State.style
+
+    # What _feed_scan feeds single bytes with
+    _feed_scan_byte = _feed_byte
 
     @staticmethod
     def _isspace(c: bytes) -> bool:
@@ -509,46 +1216,54 @@ class Squeezer:
     def _dispatch_content(self, content: bytes):
         if self.inside_title:
             if self.title is None:
-                self.title = content
-            else:
-                self.title += content
+                self.title = bytearray()
+            self._append(self.title, content, self.max_title_bytes)
+
+    @staticmethod
+    def _append(buffer: bytearray, data: bytes, limit: int):
+        # Stop buffering past limit, so hostile input costs bounded memory
+        if len(buffer) < limit:
+            buffer += data[:limit - len(buffer)]
 
     def _start_tag(self, tag: bytes):
         if not tag:
             return
         self.lastattrs = {}
-        if tag.lower() == b'title':
+        tag_lower = tag.lower()
+        if tag_lower == b'title':
             if self.title is None:
                 self.inside_title = True
-        elif tag.lower() == b'/title':
-            if self.title is not None:
-                self._log('  %s\n' % self.title.decode(self.eff_charset, 'replace'))
+        elif tag_lower == b'/title':
+            if self.title is not None and self.hook is not None:
+                self.hook('title', bytes(tag), None, bytes(self.title))
             self.inside_title = False
-        elif tag.lower() == b'/head':
+        elif tag_lower == b'/head':
             self.head_done = True
-        elif tag.lower() == b'body':
+        elif tag_lower == b'body':
             self.head_done = True
-        self._log('<%s' % tag.decode(self.eff_charset, 'replace'))
+        if self.hook is not None:
+            self.hook('start_tag', bytes(tag), None, None)
 
     def _dispatch_attr(self, tag: bytes, attr: bytes, value: [bytes, None]=None):
         if not attr:
             return
         assert tag == self.lasttag
-        self.lastattrs[attr.lower()] = value
-        if value is not None:
-            self._log('\n  %s="%s"' % (
-                attr.decode(self.eff_charset, 'replace'),
-                value.decode(self.eff_charset, 'replace')
-            ))
-        else:
-            self._log('\n  %s' % attr.decode(self.eff_charset, 'replace'))
+        value = bytes(value) if value is not None else None
+        attr_lower = bytes(attr.lower())
+        # Attributes no rule reads are not kept, so that neither memory nor
+        # getstate grows with the number of attributes of a tag
+        if attr_lower in self._meta_attrs:
+            self.lastattrs[attr_lower] = value
+        if self.hook is not None:
+            self.hook('attr', bytes(tag), bytes(attr), value)
 
     def _finish_tag(self, tag: bytes):
         if not tag:
             return
         assert tag == self.lasttag
         assert self.lastattrs is not None
-        if tag.lower() == b'meta':
+        tag_lower = tag.lower()
+        if tag_lower == b'meta':
             if self.charset is None:
                 if b'charset' in self.lastattrs:
                     self._set_charset(self.lastattrs[b'charset'])
@@ -564,63 +1279,1991 @@ class Squeezer:
                                     content_value = content_kv[1].strip()
                                     if content_key.lower() == b'charset':
                                         self._set_charset(content_value)
-            if self.description is None:
-                if b'name' in self.lastattrs:
-                    if self._lower(self.lastattrs[b'name']) == b'description':
-                        if b'content' in self.lastattrs:
-                            self.description = self.lastattrs[b'content']
-            if self.og_title is None:
-                if b'property' in self.lastattrs:
-                    if self._lower(self.lastattrs[b'property']) == b'og:title':
-                        if b'content' in self.lastattrs:
-                            self.og_title = self.lastattrs[b'content']
-            if self.og_description is None:
-                if b'property' in self.lastattrs:
-                    if self._lower(self.lastattrs[b'property']) == b'og:description':
-                        if b'content' in self.lastattrs:
-                            self.og_description = self.lastattrs[b'content']
+        rules = self.meta_index.get(bytes(tag_lower))
+        if rules is not None:
+            for attr, values in rules.items():
+                value = self.lastattrs.get(attr)
+                if value is not None:
+                    rule = values.get(value.lower())
+                    if rule is not None:
+                        field, source = rule
+                        if field not in self.meta and self.lastattrs.get(source) is not None:
+                            self.meta[field] = self.lastattrs[source]
         self.lastattrs = None
-        self._log('>\n')
+        if self.hook is not None:
+            self.hook('finish_tag', bytes(tag), None, None)
 
-    def _set_charset(self, charset: bytes) -> bool:
+    def _set_charset(self, charset: bytes, transport: bool=False) -> bool:
         if not charset:
             return
-        charset = charset.strip().decode('UTF-8', 'replace')
-        self.charset = charset
-        try:
-            b'A'.decode(charset, 'replace')
-            self.eff_charset = charset
-        except LookupError:
+        self.charset = charset.strip().decode('UTF-8', 'replace')
+        codec = lookup_charset(charset)
+        if codec is None:
             return False
+        self.eff_charset = codec.name
+        utf16 = _UTF16_CODECS.get(codec.name)
+        if utf16:
+            # UTF-16 is transcoded to UTF-8 as it is fed, since tags can not be
+            # found in it byte by byte. A <meta> declaring it is wrong, as the
+            # page must be ASCII compatible for the <meta> to be read at all,
+            # so it is read as UTF-8 like browsers do
+            self.eff_charset = 'UTF-8'
+            if transport:
+                self._decoder = lookup_charset(utf16.encode()).incrementaldecoder('replace')
+        elif transport:
+            self._decoder = None
         return True
 
     def _is_enough(self) -> bool:
-        return self.head_done or (
-            self.charset is not None and
-            (self.og_title is not None or self.title is not None) and
-            (self.og_description is not None or self.description is not None)
+        if self.head_done:
+            return True
+        for field in self.required:
+            if field == 'charset':
+                if self.charset is None:
+                    return False
+            elif field == 'title':
+                if self.title is None and 'og:title' not in self.meta:
+                    return False
+            elif field == 'description':
+                if 'description' not in self.meta and 'og:description' not in self.meta:
+                    return False
+            elif field not in self.meta:
+                return False
+        return True
+
+    def _debug(self, event: str, tag: bytes, attr: [bytes, None], value: [bytes, None]):
+        # The hook set_debug() installs, printing every tag parsed to stderr
+        if event == 'start_tag':
+            sys.stderr.write('<%s' % tag.decode(self.eff_charset, 'replace'))
+        elif event == 'attr':
+            if value is not None:
+                sys.stderr.write('\n  %s="%s"' % (
+                    attr.decode(self.eff_charset, 'replace'),
+                    value.decode(self.eff_charset, 'replace')
+                ))
+            else:
+                sys.stderr.write('\n  %s' % attr.decode(self.eff_charset, 'replace'))
+        elif event == 'finish_tag':
+            sys.stderr.write('>\n')
+        elif event == 'title':
+            sys.stderr.write('  %s\n' % value.decode(self.eff_charset, 'replace'))
+
+
+# What Profile counts the bytes and time spent in each state as
+_STATE_GROUPS = {state: ('content', 'tag', 'comment', 'script', 'style')[state // 20] for state in _STATE_NAMES}
+
+
+class _ProfiledSqueezer(Squeezer):
+    # A Squeezer with a Profile, see Squeezer.set_profile
+
+    __slots__ = ()
+
+    def reset(self, default_charset: str='UTF-8', content_type: [str, bytes, None]=None):
+        super().reset(default_charset, content_type)
+        self.profile.offsets = None
+
+    def feed(self, data: bytes=b'', final: bool=False) -> Title:
+        profile = self.profile
+        if profile.offsets is None:
+            profile._start(self)
+        consumed = self.bytes_consumed
+        started = time.perf_counter_ns()
+        result = super().feed(data, final)
+        profile.nanoseconds += time.perf_counter_ns() - started
+        profile.feeds += 1
+        profile.bytes += self.bytes_consumed - consumed
+        return result
+
+    # The steps of _feed_scan, each timed and charged to the group of the
+    # state it started in, or to 'tag' for whole tags
+
+    def _feed_run(self, run: bytes):
+        group = _STATE_GROUPS[self.state]
+        started = time.perf_counter_ns()
+        super()._feed_run(run)
+        self.profile._count(self, group, started, len(run))
+
+    def _feed_skip(self, data: bytes, pos: int) -> int:
+        group = _STATE_GROUPS[self.state]
+        started = time.perf_counter_ns()
+        stop = super()._feed_skip(data, pos)
+        self.profile._count(self, group, started, stop - pos)
+        return stop
+
+    def _feed_tags(self, data: bytes, pos: int) -> int:
+        started = time.perf_counter_ns()
+        stop = super()._feed_tags(data, pos)
+        if stop != pos:
+            self.profile._count(self, 'tag', started, stop - pos)
+        return stop
+
+    def _feed_scan_byte(self, c: bytes):
+        group = _STATE_GROUPS[self.state]
+        started = time.perf_counter_ns()
+        self._feed_byte(c)
+        self.profile._count(self, group, started, 1)
+
+    def _start_tag(self, tag: bytes):
+        if tag:
+            self.profile.tags += 1
+        super()._start_tag(tag)
+
+    def _dispatch_attr(self, tag: bytes, attr: bytes, value: [bytes, None]=None):
+        if attr:
+            self.profile.attrs += 1
+        super()._dispatch_attr(tag, attr, value)
+
+
+class Profile:
+    """Counters of what Squeezers given this Profile with set_profile spent
+    their time on, summed over every document they squeezed.
+
+    groups maps 'content', 'tag' (tags and their attributes), 'comment',
+    'script' and 'style' to the bytes parsed and nanoseconds spent in them.
+    found maps 'charset', 'title', 'description' and 'head_done' to the number
+    of documents they were found in and the sum and maximum of the byte offsets
+    they were found at, and offsets holds those offsets for the document being
+    squeezed. Offsets count the bytes parsed, which are the bytes fed except for
+    transcoded UTF-16 pages.
+    """
+
+    __slots__ = ('documents', 'feeds', 'bytes', 'nanoseconds', 'tags', 'attrs', 'groups', 'found', 'offsets', '_offset')
+
+    FIELDS = ('charset', 'title', 'description', 'head_done')
+
+    def __init__(self):
+        self.documents = 0
+        self.feeds = 0
+        self.bytes = 0
+        self.nanoseconds = 0
+        self.tags = 0
+        self.attrs = 0
+        self.groups = {group: [0, 0] for group in ('content', 'tag', 'comment', 'script', 'style')}
+        self.found = {field: [0, 0, 0] for field in self.FIELDS}
+        self.offsets = None
+        self._offset = 0
+
+    def _start(self, squeezer: Squeezer):
+        self.documents += 1
+        self.offsets = {}
+        self._offset = 0
+        self._check(squeezer)
+
+    def _count(self, squeezer: Squeezer, group: str, started: int, size: int):
+        counter = self.groups[group]
+        counter[1] += time.perf_counter_ns() - started
+        counter[0] += size
+        self._offset += size
+        if len(self.offsets) < len(self.FIELDS):
+            self._check(squeezer)
+
+    def _check(self, squeezer: Squeezer):
+        found = (
+            ('charset', squeezer.charset is not None),
+            ('title', squeezer.title is not None or 'og:title' in squeezer.meta),
+            ('description', 'description' in squeezer.meta or 'og:description' in squeezer.meta),
+            ('head_done', squeezer.head_done),
         )
+        for field, present in found:
+            if present and field not in self.offsets:
+                self.offsets[field] = self._offset
+                counter = self.found[field]
+                counter[0] += 1
+                counter[1] += self._offset
+                counter[2] = max(counter[2], self._offset)
 
-    def _log(self, s: str):
-        if self.debug:
-            sys.stderr.write(s)
+    def report(self) -> str:
+        """Format the counters as a table, for reading rather than parsing."""
+        lines = ['%d documents, %d feed() calls, %d bytes in %.3f ms, %d tags, %d attributes' % (
+            self.documents, self.feeds, self.bytes, self.nanoseconds / 1e6, self.tags, self.attrs
+        )]
+        total_bytes = sum(size for size, _ in self.groups.values()) or 1
+        lines.append('%-12s %12s %7s %12s %7s %10s' % ('group', 'bytes', '%', 'ms', '%', 'MB/s'))
+        rows = list(self.groups.items())
+        # Sniffing, transcoding and building results
+        rows.append(('other', [0, max(self.nanoseconds - sum(ns for _, ns in self.groups.values()), 0)]))
+        for group, (size, nanoseconds) in rows:
+            lines.append('%-12s %12d %6.1f%% %12.3f %6.1f%% %10s' % (
+                group, size, 100 * size / total_bytes, nanoseconds / 1e6, 100 * nanoseconds / (self.nanoseconds or 1),
+                '%.1f' % (size * 1e3 / nanoseconds) if size and nanoseconds else '-'
+            ))
+        lines.append('%-12s %12s %12s %12s' % ('found', 'documents', 'mean offset', 'max offset'))
+        for field, (count, total, maximum) in self.found.items():
+            lines.append('%-12s %12d %12s %12s' % (
+                field, count, '%.0f' % (total / count) if count else '-', maximum if count else '-'
+            ))
+        return '\n'.join(lines)
 
 
-def main():
-    squeezer = Squeezer()
-    if '-v' in sys.argv:
-        squeezer.set_debug()
-    while True:
-        data = sys.stdin.buffer.read(2048)
-        if not data:
-            sys.stderr.write('\n')
-            sys.stdout.write(str(squeezer.feed()) + '\n')
-            break
-        result = squeezer.feed(data)
-        if result.enough:
-            sys.stderr.write('\n')
-            sys.stdout.write(str(result) + '\n')
-            break
+# Transitions of Squeezer._feed_byte, compiled into flat lookup tables for
+# Squeezer(engine='table').  Each handler takes the input byte as an integer,
+# and the handlers that decide the next state by themselves return its index,
+# looked up in the index of states _TABLE[1].
+def _act_open(self, c: int):
+    self.lasttag = bytearray()
+    self.lastattr = bytearray()
+    self.lastvalue = None
+
+
+def _act_content(self, c: int):
+    self._dispatch_content(_BYTES[c])
+
+
+def _act_content_space(self, c: int):
+    self._dispatch_content(b'\x20')
+
+
+def _act_tag_space(self, c: int):
+    self._dispatch_content(b'&lt;' + _BYTES[c])
+
+
+def _act_content_prefix(prefix: bytes):
+    def act(self, c: int):
+        self._dispatch_content(prefix)
+    return act
+
+
+def _act_set_tag(prefix: bytes):
+    def act(self, c: int):
+        self.lasttag = bytearray((prefix + _BYTES[c])[:self.max_attr_value_bytes])
+    return act
+
+
+def _act_append_tag(self, c: int):
+    self._append(self.lasttag, _BYTES[c], self.max_attr_value_bytes)
+
+
+def _act_append_tag_slash(self, c: int):
+    self._append(self.lasttag, b'/', self.max_attr_value_bytes)
+
+
+def _act_start(self, c: int):
+    self._start_tag(self.lasttag)
+
+
+def _act_start_slash(self, c: int):
+    self._append(self.lasttag, b'/', self.max_attr_value_bytes)
+    self._start_tag(self.lasttag)
+
+
+def _act_start_prefix(prefix: bytes):
+    def act(self, c: int):
+        self.lasttag = bytearray(prefix)
+        self._start_tag(self.lasttag)
+    return act
+
+
+def _act_start_reopen(self, c: int):
+    self._start_tag(self.lasttag)
+    self.lasttag = bytearray()
+
+
+def _act_start_finish(self, c: int):
+    self._start_tag(self.lasttag)
+    self._finish_tag(self.lasttag)
+
+
+def _act_start_finish_prefix(prefix: bytes):
+    def act(self, c: int):
+        self.lasttag = bytearray(prefix)
+        self._start_tag(self.lasttag)
+        self._finish_tag(self.lasttag)
+    return act
+
+
+def _act_start_finish_raw(self, c: int) -> int:
+    self._start_tag(self.lasttag)
+    self._finish_tag(self.lasttag)
+    return _TABLE[1][_SCAN_RAWTEXT.get(bytes(self.lasttag.lower()), State.content)]
+
+
+def _act_append_attr(self, c: int):
+    self._append(self.lastattr, _BYTES[c], self.max_attr_value_bytes)
+
+
+def _act_append_attr_slash(self, c: int):
+    self._append(self.lastattr, b'/', self.max_attr_value_bytes)
+
+
+def _act_attr(self, c: int):
+    self._dispatch_attr(self.lasttag, self.lastattr)
+    self.lastattr = bytearray()
+    self.lastvalue = None
+
+
+def _act_attr_slash(self, c: int):
+    self._append(self.lastattr, b'/', self.max_attr_value_bytes)
+    _act_attr(self, c)
+
+
+def _act_attr_reopen(self, c: int):
+    self._dispatch_attr(self.lasttag, self.lastattr)
+    self.lasttag = bytearray()
+    self.lastattr = bytearray()
+    self.lastvalue = None
+
+
+def _act_attr_finish(self, c: int):
+    self._dispatch_attr(self.lasttag, self.lastattr)
+    self._finish_tag(self.lasttag)
+
+
+def _act_attr_finish_raw(self, c: int) -> int:
+    _act_attr_finish(self, c)
+    return _TABLE[1][_SCAN_RAWTEXT.get(bytes(self.lasttag.lower()), State.content)]
+
+
+def _act_begin_value(self, c: int):
+    self.lastvalue = bytearray()
+
+
+def _act_append_value(self, c: int):
+    self._append(self.lastvalue, _BYTES[c], self.max_attr_value_bytes)
+
+
+def _act_append_value_slash(self, c: int):
+    self._append(self.lastvalue, b'/', self.max_attr_value_bytes)
+
+
+def _act_value(self, c: int):
+    self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
+    self.lastattr = bytearray()
+    self.lastvalue = None
+
+
+def _act_value_slash(self, c: int):
+    self._append(self.lastvalue, b'/', self.max_attr_value_bytes)
+    _act_value(self, c)
+
+
+def _act_value_reopen(self, c: int):
+    self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
+    self.lasttag = bytearray()
+    self.lastattr = bytearray()
+    self.lastvalue = None
+
+
+def _act_value_finish_raw(self, c: int) -> int:
+    self._dispatch_attr(self.lasttag, self.lastattr, self.lastvalue)
+    self._finish_tag(self.lasttag)
+    return _TABLE[1][_SCAN_RAWTEXT.get(bytes(self.lasttag.lower()), State.content)]
+
+
+def _rawtext_transitions(base: int, name: bytes) -> dict:
+    # <script> and <style> bodies: match "</name", spaces, then ">"
+    states = [getattr(State, _STATE_NAMES[base] + suffix) for suffix in ('', 'tag', 'tagslash')]
+    states += [getattr(State, _STATE_NAMES[base] + 'tagslash' + name[:i+1].decode()) for i in range(len(name))]
+    transitions = {base: {b'<': (None, states[1]), None: (None, base)}}
+    transitions[states[1]] = {b'/': (None, states[2]), None: (None, base)}
+    for i in range(len(name)):
+        letter = name[i:i+1]
+        transitions[states[i+2]] = {letter.upper() + letter: (None, states[i+3]), None: (None, base)}
+    transitions[states[-1]] = {
+        _SPACES: (None, states[-1]),
+        b'>':    (_act_start_finish_prefix(b'/' + name), State.content),
+        None:    (None, base),
+    }
+    return transitions
+
+
+# {state: {bytes triggering the transition, or None for any other byte:
+#          (handler or None, next state or None if the handler returns it)}}
+_TABLE_TRANSITIONS = {
+    State.content: {
+        _SPACES: (_act_content_space, State.contentspace),
+        b'<':    (_act_open, State.tag),
+        None:    (_act_content, State.content),
+    },
+    State.contentspace: {
+        _SPACES: (None, State.contentspace),
+        b'<':    (_act_open, State.tag),
+        None:    (_act_content, State.content),
+    },
+    State.tag: {
+        _SPACES: (_act_tag_space, State.content),
+        b'<':    (_act_content_prefix(b'&lt;'), State.tag),
+        b'>':    (_act_content_prefix(b'&lt;&gt;'), State.content),
+        b'!':    (None, State.tagbang),
+        b'/':    (None, State.tagslash),
+        None:    (_act_set_tag(b''), State.tagname),
+    },
+    State.tagname: {
+        _SPACES: (_act_start, State.attrname),
+        b'<':    (_act_start_reopen, State.tag),
+        b'>':    (_act_start_finish_raw, None),
+        b'/':    (None, State.tagnameslash),
+        None:    (_act_append_tag, State.tagname),
+    },
+    State.tagnameslash: {
+        _SPACES: (_act_start_slash, State.attrname),
+        b'<':    (_act_start_reopen, State.tag),
+        b'>':    (_act_start_finish, State.content),
+        b'/':    (_act_append_tag_slash, State.tagnameslash),
+        None:    (_act_append_tag, State.tagname),
+    },
+    State.attrname: {
+        _SPACES: (_act_attr, State.attrname),
+        b'<':    (_act_attr_reopen, State.tag),
+        b'>':    (_act_attr_finish_raw, None),
+        b'/':    (None, State.attrnameslash),
+        b'=':    (_act_begin_value, State.attrvalue),
+        None:    (_act_append_attr, State.attrname),
+    },
+    State.attrnameslash: {
+        _SPACES: (_act_attr_slash, State.attrnameslash),
+        b'<':    (_act_attr_reopen, State.tag),
+        b'>':    (_act_attr_finish, State.content),
+        b'/':    (_act_append_attr_slash, State.attrnameslash),
+        b'=':    (_act_begin_value, State.attrvalue),
+        None:    (_act_append_attr, State.attrname),
+    },
+    State.attrvalue: {
+        _SPACES: (_act_value, State.attrname),
+        b'<':    (_act_value_reopen, State.tag),
+        b'>':    (_act_value_finish_raw, None),
+        b'/':    (None, State.attrvalueslash),
+        b'"':    (None, State.attrquote),
+        None:    (_act_append_value, State.attrvalue),
+    },
+    State.attrquote: {
+        b'"':    (None, State.attrvalue),
+        None:    (_act_append_value, State.attrquote),
+    },
+    State.attrvalueslash: {
+        _SPACES: (_act_value_slash, State.attrname),
+        b'<':    (_act_value_reopen, State.tag),
+        b'>':    (_act_value_finish_raw, None),
+        b'/':    (_act_append_value_slash, State.attrvalueslash),
+        b'"':    (None, State.attrquote),
+        None:    (_act_append_value, State.attrvalue),
+    },
+    State.tagslash: {
+        _SPACES: (_act_start_prefix(b'/'), State.attrname),
+        b'<':    (_act_content_prefix(b'&lt;/'), State.tag),
+        b'>':    (_act_start_finish_prefix(b'/'), State.content),
+        None:    (_act_set_tag(b'/'), State.tagname),
+    },
+    State.tagbang: {
+        _SPACES: (_act_start_prefix(b'!'), State.attrname),
+        b'<':    (_act_content_prefix(b'&lt;!'), State.tag),
+        b'>':    (_act_start_finish_prefix(b'!'), State.content),
+        b'-':    (None, State.tagbangdash),
+        None:    (_act_set_tag(b'!'), State.tagname),
+    },
+    State.tagbangdash: {
+        _SPACES: (_act_start_prefix(b'!-'), State.attrname),
+        b'<':    (_act_content_prefix(b'&lt;!-'), State.tag),
+        b'>':    (_act_start_finish_prefix(b'!-'), State.content),
+        b'-':    (None, State.comment),
+        None:    (_act_set_tag(b'!-'), State.tagname),
+    },
+    State.comment: {
+        b'-':    (None, State.commentdash),
+        None:    (None, State.comment),
+    },
+    State.commentdash: {
+        b'-':    (None, State.commentdashdash),
+        None:    (None, State.comment),
+    },
+    State.commentdashdash: {
+        b'>':    (None, State.content),
+        None:    (None, State.comment),
+    },
+    **_rawtext_transitions(State.script, b'script'),
+    **_rawtext_transitions(State.style, b'style'),
+}
+
+
+def _compile_table() -> (list, dict, bytes, bytes, list):
+    states = list(_STATE_NAMES)
+    index = {state: i for i, state in enumerate(states)}
+    handlers = [None]
+    next_states = bytearray(len(states) * 256)
+    actions = bytearray(len(states) * 256)
+    for state, transitions in _TABLE_TRANSITIONS.items():
+        for c in range(256):
+            for trigger, (handler, next_state) in transitions.items():
+                if trigger is not None and c in trigger:
+                    break
+            else:
+                handler, next_state = transitions[None]
+            i = index[state] << 8 | c
+            next_states[i] = index[next_state] if next_state is not None else 0
+            if handler is not None:
+                if handler not in handlers:
+                    handlers.append(handler)
+                actions[i] = handlers.index(handler)
+    assert len(handlers) <= 256 and set(_TABLE_TRANSITIONS) == set(states)
+    return states, index, bytes(next_states), bytes(actions), handlers
+
+
+# What _compile_table returns, compiled on the first feed() of a
+# Squeezer(engine='table'), since that takes longer than the rest of the import
+_TABLE = None
+
+
+def _load_table() -> tuple:
+    # The tables are published by a single assignment, so that a thread never
+    # sees some of them compiled and others not. Threads racing to compile
+    # them each assign equal tables
+    global _TABLE
+    table = _TABLE
+    if table is None:
+        table = _TABLE = _compile_table()
+    return table
+
+
+# Number of bytes read from a file or stdin at a time
+_READ_SIZE = 2048
+# Number of bytes read from, or inflated for, an HTTP response at a time
+_FETCH_SIZE = 16384
+
+
+def _read_chunks(read, chunk_size: int=_READ_SIZE, max_chunk_size: int=0):
+    # Yield what read() returns until the end of the stream, doubling the read
+    # size after every read up to max_chunk_size, so that a short <head> costs
+    # one small read while a long one does not cost many
+    max_chunk_size = max(chunk_size, max_chunk_size)
+    while True:
+        data = read(chunk_size)
+        if not data:
+            return
+        yield data
+        chunk_size = min(chunk_size * 2, max_chunk_size)
+
+
+def _squeeze_stream(squeezer: Squeezer, chunks) -> Title:
+    for data in chunks:
+        result = squeezer.feed(data)
+        if result.enough:
+            return result
+        if result.budget_exhausted:
+            break
+    return squeezer.feed(final=True)
+
+
+def squeeze_file(
+    path: [str, os.PathLike], default_charset: str='UTF-8', engine: str='scan', max_bytes: int=0, deadline: float=0
+) -> Title:
+    """Squeeze a file through a memory map, one page at a time, so that
+    nothing past the page where the result became enough is ever read."""
+    return _squeeze_path(Squeezer(default_charset, engine, max_bytes=max_bytes, deadline=deadline), path)
+
+
+def _squeeze_path(squeezer: Squeezer, path: [str, os.PathLike]) -> Title:
+    with open(path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Empty files, pipes and other files that can not be mapped
+            return _squeeze_stream(squeezer, _read_chunks(f.read))
+        with mapped:
+            view = memoryview(mapped)
+            try:
+                return _squeeze_stream(squeezer, (view[i:i+mmap.PAGESIZE] for i in range(0, len(view), mmap.PAGESIZE)))
+            finally:
+                view.release()
+
+
+def _squeeze_one(squeezer: Squeezer, document: [bytes, str, os.PathLike], default_charset: str) -> Title:
+    squeezer.reset(default_charset)
+    if isinstance(document, (bytes, bytearray, memoryview)):
+        return _squeeze_stream(squeezer, (document[i:i+_READ_SIZE] for i in range(0, len(document), _READ_SIZE)))
+    return _squeeze_path(squeezer, document)
+
+
+def _squeeze_documents(squeezer: Squeezer, documents, default_charset: str):
+    # Yield the Title of every document, or the OSError raised opening it
+    for document in documents:
+        try:
+            yield _squeeze_one(squeezer, document, default_charset)
+        except OSError as e:
+            yield e
+
+
+def _squeeze_batch(documents: list, default_charset: str, engine: str, max_bytes: int, deadline: float) -> list:
+    squeezer = Squeezer(default_charset, engine, max_bytes=max_bytes, deadline=deadline)
+    return list(_squeeze_documents(squeezer, documents, default_charset))
+
+
+class SqueezerPool:
+    """A bounded pool of Squeezers, reset before they are handed out again,
+    for services that squeeze a document per request from several threads or
+    tasks and would otherwise construct a Squeezer for each.
+
+    with pool.squeezer() as squeezer:
+        result = squeezer.feed(data)
+
+    A Squeezer comes back to the pool with the settings it was constructed
+    with, whatever its last borrower changed, like max_bytes or the hook.
+    """
+
+    __slots__ = ('default_charset', 'engine', '_idle', '_settings')
+
+    def __init__(self, size: int=16, default_charset: str='UTF-8', engine: str='scan'):
+        self.default_charset = default_charset
+        self.engine = engine
+        # Appending to or popping from a deque is atomic, and a full deque drops
+        # its oldest Squeezer, so no lock is needed to keep at most size idle
+        self._idle = collections.deque(maxlen=size)
+        squeezer = Squeezer(default_charset, engine)
+        self._settings = self._get_settings(squeezer)
+        self._idle.append(squeezer)
+
+    def acquire(self) -> Squeezer:
+        try:
+            squeezer = self._idle.pop()
+        except IndexError:
+            return Squeezer(self.default_charset, self.engine)
+        squeezer.reset(self.default_charset)
+        return squeezer
+
+    def release(self, squeezer: Squeezer):
+        squeezer.hook = None
+        if squeezer.profile is not None:
+            squeezer.set_profile(None)
+        (
+            squeezer.engine, squeezer.max_title_bytes, squeezer.max_attr_value_bytes, squeezer.meta_index,
+            squeezer._inert_tags, squeezer._meta_attrs, squeezer.required, squeezer.max_bytes, squeezer.deadline,
+            squeezer.clock
+        ) = self._settings
+        self._idle.append(squeezer)
+
+    @staticmethod
+    def _get_settings(squeezer: Squeezer) -> tuple:
+        # What a Squeezer is constructed with, as opposed to what it finds in
+        # a page, in the order release() restores it in
+        return (
+            squeezer.engine, squeezer.max_title_bytes, squeezer.max_attr_value_bytes, squeezer.meta_index,
+            squeezer._inert_tags, squeezer._meta_attrs, squeezer.required, squeezer.max_bytes, squeezer.deadline,
+            squeezer.clock
+        )
+
+    def squeezer(self) -> '_Loan':
+        return _Loan(self)
+
+
+class _Loan:
+    # The context manager of SqueezerPool.squeezer(), a class rather than a
+    # contextlib.contextmanager generator, which costs more than constructing
+    # a Squeezer does
+
+    __slots__ = ('pool', 'squeezer')
+
+    def __init__(self, pool: SqueezerPool):
+        self.pool = pool
+
+    def __enter__(self) -> Squeezer:
+        self.squeezer = self.pool.acquire()
+        return self.squeezer
+
+    def __exit__(self, *exc_info):
+        self.pool.release(self.squeezer)
+
+
+def squeeze_many(
+    documents, workers: [int, None]=None, chunksize: int=64, default_charset: str='UTF-8', engine: str='scan',
+    max_bytes: int=0, deadline: float=0
+):
+    """Squeeze every document, given either as bytes or as a file path, on a
+    pool of worker processes, and yield their Title results in input order,
+    or the OSError raised opening a file.
+
+    Documents are sent to the workers in batches of chunksize. File paths are
+    opened by the workers, so only the paths need to be sent to them. The
+    number of batches in flight is bounded, so documents may be a lazy
+    iterable of any length.
+    """
+    squeeze_batch = functools.partial(
+        _squeeze_batch, default_charset=default_charset, engine=engine, max_bytes=max_bytes, deadline=deadline
+    )
+    documents = iter(documents)
+    batches = iter(lambda: list(itertools.islice(documents, chunksize)), [])
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for batch in batches:
+            yield from squeeze_batch(batch)
+        return
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        pending = collections.deque()
+        for batch in batches:
+            pending.append(executor.submit(squeeze_batch, batch))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class SqueezeExecutor:
+    """Squeeze documents, given either as bytes or as file paths, on a pool of
+    threads, for servers that squeeze pages in request handler threads.
+
+    Every document is fed in slices of at most chunk_size bytes, so that no
+    single call into the tokenizer holds the GIL for long, and is cut short
+    after max_bytes bytes or cpu_time seconds of CPU, so that a pathological
+    page can not take a thread for long. Each task gets its own Squeezer from a
+    SqueezerPool, and the tables all Squeezers share are never written to, so
+    the executor also works on free-threaded builds of Python.
+
+    with SqueezeExecutor(max_bytes=1 << 20, cpu_time=0.5) as executor:
+        future = executor.submit(page)
+    """
+
+    def __init__(
+        self, workers: [int, None]=None, max_bytes: int=0, cpu_time: float=0, chunk_size: int=65536,
+        default_charset: str='UTF-8', engine: str='scan'
+    ):
+        if workers is None:
+            workers = min(32, (os.cpu_count() or 1) + 4)
+        self.workers = workers
+        # Handed on to each Squeezer, which would never check them
+        if not (max_bytes >= 0 and cpu_time >= 0):
+            raise ValueError('max_bytes and cpu_time must not be negative: %r, %r' % (max_bytes, cpu_time))
+        self.max_bytes = max_bytes
+        self.cpu_time = cpu_time
+        self.chunk_size = chunk_size
+        import concurrent.futures
+        self._executor = concurrent.futures.ThreadPoolExecutor(workers)
+        self._pool = SqueezerPool(workers, default_charset, engine)
+
+    def submit(self, document: [bytes, str, os.PathLike]) -> 'concurrent.futures.Future':
+        return self._executor.submit(self._squeeze, document)
+
+    def map(self, documents):
+        """Yield the Title of every document in input order, with a bounded
+        number of documents in flight, so documents may be a lazy iterable."""
+        pending = collections.deque()
+        for document in documents:
+            pending.append(self.submit(document))
+            if len(pending) >= self.workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def shutdown(self, wait: bool=True):
+        self._executor.shutdown(wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def _squeeze(self, document: [bytes, str, os.PathLike]) -> Title:
+        with self._pool.squeezer() as squeezer:
+            squeezer.max_bytes = self.max_bytes
+            squeezer.deadline = self.cpu_time
+            squeezer.clock = time.thread_time
+            if not isinstance(document, (bytes, bytearray, memoryview)):
+                return _squeeze_path(squeezer, document)
+            document = memoryview(document)
+            size = self.chunk_size
+            return _squeeze_stream(squeezer, (document[i:i+size] for i in range(0, len(document), size)))
+
+
+class ResultCache:
+    """A cache of Title results kept in an SQLite file, keyed by URL, or by
+    anything else that identifies a document, like a hash of its body.
+
+    Entries older than ttl seconds are stale: get() misses them, but Fetcher
+    revalidates them with their ETag or Last-Modified and keeps them on a 304.
+    Past max_entries, the least recently used entries are evicted. Hits,
+    misses and their latencies are counted in the file too, see stats().
+    """
+
+    def __init__(self, path: [str, os.PathLike], ttl: float=3600, max_entries: int=100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        import sqlite3
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        # A cache can lose its last writes in a crash, but must not pay a
+        # sync to disk for every lookup
+        self._db.executescript('''
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY, url TEXT, etag TEXT, last_modified TEXT, digest BLOB,
+                enough INTEGER, title BLOB, description BLOB, charset TEXT, eff_charset TEXT, meta TEXT,
+                stored REAL, used REAL
+            );
+            CREATE INDEX IF NOT EXISTS results_used ON results (used);
+            CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value REAL);
+        ''')
+        # Counters not yet added to the stats table
+        self._stats = collections.Counter()
+        self._puts = 0
+
+    def get(self, key: str) -> [Title, None]:
+        # Misses are counted by put(), along with how long they took
+        started = time.perf_counter()
+        entry = self.lookup(key)
+        if entry is None or not entry['fresh']:
+            return None
+        self.record('hits', time.perf_counter() - started)
+        return entry['result']
+
+    def lookup(self, key: str) -> [dict, None]:
+        """Return the entry for key, fresh or stale, as a dict of its result,
+        url, etag, last_modified, digest and fresh, or None."""
+        row = self._db.execute(
+            'SELECT url, etag, last_modified, digest, enough, title, description, charset, eff_charset, meta, stored '
+            'FROM results WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        url, etag, last_modified, digest, enough, title, description, charset, eff_charset, meta, stored = row
+        now = time.time()
+        self._db.execute('UPDATE results SET used = ? WHERE key = ?', (now, key))
+        import json
+        meta = {field: value.encode('latin-1') for field, value in json.loads(meta).items()}
+        return dict(
+            result=Title(bool(enough), title, description, charset, eff_charset, meta),
+            url=url, etag=etag, last_modified=last_modified, digest=digest, fresh=now - stored < self.ttl
+        )
+
+    def put(
+        self, key: str, result: Title, url: [str, None]=None,
+        etag: [str, None]=None, last_modified: [str, None]=None, digest: [bytes, None]=None, seconds: float=0
+    ):
+        # seconds is how long it took to fetch and squeeze result after a miss
+        self.record('misses', seconds)
+        now = time.time()
+        import json
+        meta = json.dumps({field: value.decode('latin-1') for field, value in result.meta.items()})
+        self._db.execute(
+            'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                key, url, etag, last_modified, digest, result.enough, result.title, result.description,
+                result.charset, result.eff_charset, meta, now, now
+            )
+        )
+        self._puts += 1
+        if self._puts % 64 == 0:
+            self.evict()
+
+    def touch(self, key: str):
+        # Make a stale entry fresh again, after the server said it is unchanged
+        self._db.execute('UPDATE results SET stored = ? WHERE key = ?', (time.time(), key))
+
+    def evict(self):
+        self._db.execute(
+            'DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+    def record(self, outcome: str, seconds: float=0):
+        # outcome is 'hits', 'misses' or 'revalidated'
+        self._stats[outcome] += 1
+        self._stats[outcome + '_seconds'] += seconds
+
+    def stats(self) -> dict:
+        """Return the number of entries, hits, misses and revalidations so
+        far, the hit rate, and the mean latency of each in milliseconds."""
+        totals = collections.Counter(dict(self._db.execute('SELECT name, value FROM stats')))
+        totals.update(self._stats)
+        lookups = totals['hits'] + totals['misses'] + totals['revalidated']
+        result = dict(
+            entries=self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0],
+            hits=int(totals['hits']), misses=int(totals['misses']), revalidated=int(totals['revalidated']),
+            hit_rate=(totals['hits'] + totals['revalidated']) / lookups if lookups else None
+        )
+        for outcome in ('hits', 'misses', 'revalidated'):
+            result['mean_%s_ms' % outcome] = totals[outcome + '_seconds'] / totals[outcome] * 1000 if totals[outcome] else None
+        return result
+
+    def close(self):
+        self.evict()
+        self._db.executemany(
+            'INSERT INTO stats VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+            self._stats.items()
+        )
+        self._stats.clear()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _decompressor(content_encoding: str):
+    # A zlib decompressor for an HTTP Content-Encoding, None for identity
+    content_encoding = content_encoding.strip().lower()
+    if content_encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if content_encoding == 'deflate':
+        return _DeflateDecompressor()
+    return None
+
+
+class _DeflateDecompressor:
+    # A decompressor for Content-Encoding: deflate, which should be zlib
+    # wrapped but is raw deflate from many servers. The first two bytes are
+    # held back until they tell a zlib header apart from raw deflate
+
+    __slots__ = ('decompressor', 'head')
+
+    def __init__(self):
+        self.decompressor = None
+        self.head = b''
+
+    @property
+    def unconsumed_tail(self) -> bytes:
+        return b'' if self.decompressor is None else self.decompressor.unconsumed_tail
+
+    def decompress(self, data: bytes, max_length: int=0) -> bytes:
+        if self.decompressor is None:
+            self.head += data
+            if len(self.head) < 2:
+                return b''
+            data, self.head = self.head, b''
+            self.decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+            try:
+                return self.decompressor.decompress(data, max_length)
+            except zlib.error:
+                self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self.decompressor.decompress(data, max_length)
+
+    def flush(self) -> bytes:
+        if self.decompressor is None:
+            return zlib.decompressobj(-zlib.MAX_WBITS).decompress(self.head) if self.head else b''
+        return self.decompressor.flush()
+
+
+class FetchError(Exception):
+    pass
+
+
+class Fetcher:
+    """Download pages with asyncio and squeeze them while they arrive.
+
+    The connection is closed as soon as the result is enough, so the rest of
+    the page is never downloaded. Connections that were read to the end are
+    kept for reuse, and at most per_host requests run against one host, and
+    at most limit requests in total, at the same time.
+    """
+
+    def __init__(self, per_host: int=4, limit: int=64, timeout: float=30, max_redirects: int=5):
+        if per_host < 1 or limit < 1:
+            raise ValueError('per_host and limit must be at least 1')
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.bytes_received = 0
+        import asyncio
+        self._limit = asyncio.Semaphore(limit)
+        self._host_limits = {}
+        self._idle = {}
+        self._ssl = None
+
+    async def squeeze(
+        self, url: str, default_charset: str='UTF-8', engine: str='scan', cache: [ResultCache, None]=None,
+        max_bytes: int=0, deadline: float=0
+    ) -> Title:
+        import asyncio
+        import urllib.parse
+        started = time.perf_counter()
+        squeezer = Squeezer(default_charset, engine, max_bytes=max_bytes, deadline=deadline)
+        entry = None
+        validators = {}
+        target = url
+        if cache is not None:
+            entry = cache.lookup(url)
+            if entry is not None:
+                if entry['fresh']:
+                    cache.record('hits', time.perf_counter() - started)
+                    return entry['result']
+                # Ask the URL the page was last found at whether it changed
+                target = entry['url'] or url
+                if entry['etag']:
+                    validators['If-None-Match'] = entry['etag']
+                if entry['last_modified']:
+                    validators['If-Modified-Since'] = entry['last_modified']
+        for _ in range(self.max_redirects + 1):
+            status, result, headers, digest = await asyncio.wait_for(
+                self._squeeze_once(target, squeezer, default_charset, validators), self.timeout
+            )
+            if status == 304 and entry is not None:
+                cache.touch(url)
+                cache.record('revalidated', time.perf_counter() - started)
+                return entry['result']
+            if status not in (301, 302, 303, 307, 308) or 'location' not in headers:
+                if cache is not None:
+                    seconds = time.perf_counter() - started
+                    if status == 200 and not result.budget_exhausted:
+                        cache.put(url, result, target, headers.get('etag'), headers.get('last-modified'), digest, seconds)
+                    else:
+                        cache.record('misses', seconds)
+                return result
+            target = urllib.parse.urljoin(target, headers['location'])
+            validators = {}
+        raise FetchError('too many redirects: %s' % target)
+
+    async def close(self):
+        for connections in self._idle.values():
+            for reader, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _squeeze_once(
+        self, url: str, squeezer: Squeezer, default_charset: str, validators: dict
+    ) -> (int, [Title, None], dict, [bytes, None]):
+        # Return the status, the result, the headers, and a hash of the body
+        # fed until the result was enough
+        import asyncio
+        import hashlib
+        import urllib.parse
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise FetchError('unsupported URL: %s' % url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        request = (
+            'GET %s HTTP/1.1\r\n'
+            'Host: %s\r\n'
+            'User-Agent: Title-Squeezer\r\n'
+            'Accept: text/html,application/xhtml+xml,*/*;q=0.8\r\n'
+            'Accept-Encoding: gzip, deflate\r\n'
+            'Connection: keep-alive\r\n'
+            '%s'
+            '\r\n' % (
+                target, parts.netloc.rpartition('@')[2],
+                ''.join('%s: %s\r\n' % (name, value) for name, value in validators.items())
+            )
+        ).encode('ascii', 'replace')
+        host_limit = self._host_limits.get(key)
+        if host_limit is None:
+            host_limit = self._host_limits[key] = asyncio.Semaphore(self.per_host)
+        async with self._limit, host_limit:
+            reused = bool(self._idle.get(key))
+            reader, writer = await self._connect(key)
+            try:
+                try:
+                    status, headers = await self._request(reader, writer, request)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    if not reused:
+                        raise
+                    # The server closed an idle connection, retry on a new one
+                    writer.close()
+                    reader, writer = await self._connect(key, reuse=False)
+                    status, headers = await self._request(reader, writer, request)
+                if status in (301, 302, 303, 307, 308) and 'location' in headers:
+                    writer.close()
+                    return status, None, headers, None
+                result = None
+                digest = None
+                if status == 304:
+                    # Not modified, and without a body
+                    reusable = headers.get('connection', '').lower() != 'close'
+                else:
+                    reusable = False
+                    digest = hashlib.blake2b(digest_size=16)
+                    squeezer.reset(default_charset, headers.get('content-type'))
+                    body = self._read_body(reader, headers)
+                    async for data in self._decode_body(body, headers.get('content-encoding', '')):
+                        digest.update(data)
+                        result = squeezer.feed(data)
+                        if result.enough or result.budget_exhausted:
+                            break
+                    else:
+                        result = squeezer.feed(final=True)
+                        reusable = 'chunked' in headers.get('transfer-encoding', '').lower() or 'content-length' in headers
+                        reusable = reusable and headers.get('connection', '').lower() != 'close'
+                    digest = digest.digest()
+            except BaseException:
+                writer.close()
+                raise
+            if reusable:
+                self._idle.setdefault(key, []).append((reader, writer))
+            else:
+                writer.close()
+            return status, result, headers, digest
+
+    async def _connect(self, key: tuple, reuse: bool=True) -> ('asyncio.StreamReader', 'asyncio.StreamWriter'):
+        import asyncio
+        idle = self._idle.get(key)
+        if reuse and idle:
+            return idle.pop()
+        scheme, host, port = key
+        if scheme == 'https':
+            if self._ssl is None:
+                import ssl
+                self._ssl = ssl.create_default_context()
+            return await asyncio.open_connection(host, port, ssl=self._ssl, server_hostname=host)
+        return await asyncio.open_connection(host, port)
+
+    async def _request(self, reader: 'asyncio.StreamReader', writer: 'asyncio.StreamWriter', request: bytes) -> (int, dict):
+        writer.write(request)
+        await writer.drain()
+        return await self._read_head(reader)
+
+    async def _read_head(self, reader: 'asyncio.StreamReader') -> (int, dict):
+        line = await reader.readuntil(b'\r\n')
+        self.bytes_received += len(line)
+        status_line = line.split(None, 2)
+        if len(status_line) < 2 or not status_line[0].startswith(b'HTTP/') or not status_line[1].isdigit():
+            raise FetchError('bad status line: %r' % line)
+        headers = {}
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            self.bytes_received += len(line)
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return int(status_line[1]), headers
+
+    async def _read_body(self, reader: 'asyncio.StreamReader', headers: dict):
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            while True:
+                line = await reader.readuntil(b'\r\n')
+                self.bytes_received += len(line)
+                size = int(line.split(b';', 1)[0], 16)
+                if size == 0:
+                    while line != b'\r\n':
+                        line = await reader.readuntil(b'\r\n')
+                        self.bytes_received += len(line)
+                    return
+                while size:
+                    data = await reader.read(min(size, _FETCH_SIZE))
+                    if not data:
+                        raise FetchError('connection closed inside a chunk')
+                    self.bytes_received += len(data)
+                    size -= len(data)
+                    yield data
+                self.bytes_received += len(await reader.readexactly(2))
+        elif 'content-length' in headers:
+            size = int(headers['content-length'])
+            while size:
+                data = await reader.read(min(size, _FETCH_SIZE))
+                if not data:
+                    raise FetchError('connection closed before the end of the body')
+                self.bytes_received += len(data)
+                size -= len(data)
+                yield data
+        else:
+            while True:
+                data = await reader.read(_FETCH_SIZE)
+                if not data:
+                    return
+                self.bytes_received += len(data)
+                yield data
+
+    @staticmethod
+    async def _decode_body(body, content_encoding: str):
+        decompressor = _decompressor(content_encoding)
+        if decompressor is None:
+            async for data in body:
+                yield data
+            return
+        async for data in body:
+            # Inflate at most _FETCH_SIZE bytes at a time, so that nothing
+            # past the point where the result is enough gets inflated
+            while data:
+                data = decompressor.decompress(data, _FETCH_SIZE)
+                if data:
+                    yield data
+                data = decompressor.unconsumed_tail
+        data = decompressor.flush()
+        if data:
+            yield data
+
+
+def squeeze_urls(
+    urls, per_host: int=4, limit: int=64, timeout: float=30, default_charset: str='UTF-8', engine: str='scan',
+    cache: [ResultCache, None]=None, max_bytes: int=0, deadline: float=0
+) -> list:
+    """Fetch and squeeze every URL concurrently with a Fetcher, and return
+    their Title results in input order, or the exception raised for a URL.
+    URLs found fresh in cache are neither fetched nor squeezed."""
+    import asyncio
+
+    async def squeeze_all():
+        async with Fetcher(per_host, limit, timeout) as fetcher:
+            return await asyncio.gather(
+                *(fetcher.squeeze(url, default_charset, engine, cache, max_bytes, deadline) for url in urls),
+                return_exceptions=True
+            )
+    return asyncio.run(squeeze_all())
+
+
+# Longest WARC or HTTP header block read before a record is given up on
+_WARC_HEAD_SIZE = 65536
+# Whitespace between WARC records, where there should be none
+_WARC_SPACE = re.compile(rb'[\x09\x0a\x0d\x20]*')
+# Content types squeezed in WARC records, '' being a payload without one
+_HTML_TYPES = frozenset(('', 'text/html', 'application/xhtml+xml'))
+
+
+class WarcError(Exception):
+    pass
+
+
+def _parse_head(head: bytes) -> (bytes, dict):
+    # The first line and the lower cased fields of an HTTP or WARC header block
+    lines = head.split(b'\r\n')
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return lines[0], headers
+
+
+class _WarcReader:
+    # Read the records of an uncompressed WARC file from offset pos
+
+    __slots__ = ('mapped', 'pos')
+
+    def __init__(self, mapped: mmap.mmap, pos: int):
+        self.mapped = mapped
+        self.pos = pos
+
+    def read(self, size: int) -> bytes:
+        data = self.mapped[self.pos:self.pos+size]
+        self.pos += len(data)
+        return data
+
+    def read_head(self) -> [bytes, None]:
+        # The next header block, None at the end of the file or before a
+        # gzipped record
+        end = self.mapped.find(b'\r\n\r\n', self.pos, self.pos + _WARC_HEAD_SIZE)
+        if end < 0 or self.mapped[self.pos:self.pos+5] != b'WARC/':
+            return None
+        head = self.mapped[self.pos:end]
+        self.pos = end + 4
+        return head
+
+    def skip(self, size: int) -> [int, None]:
+        self.pos += size
+        return None
+
+    def end(self) -> [int, None]:
+        # Where the next reader starts, None if nothing readable is left
+        if self.pos >= len(self.mapped) or self.mapped[self.pos:self.pos+2] == b'\x1f\x8b':
+            return self.pos
+        return None
+
+
+class _GzipWarcReader:
+    # Read the records of one gzip member of a WARC file starting at offset
+    # pos, inflating only what is read
+
+    __slots__ = ('mapped', 'pos', 'decompressor', 'buffer', 'inflated')
+
+    def __init__(self, mapped: mmap.mmap, pos: int):
+        self.mapped = mapped
+        self.pos = pos
+        self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # Inflated bytes given back by read_head
+        self.buffer = b''
+        # Bytes inflated from the member so far
+        self.inflated = 0
+
+    def read(self, size: int) -> bytes:
+        if self.buffer:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+            return data
+        decompressor = self.decompressor
+        while not decompressor.eof:
+            data = decompressor.unconsumed_tail
+            if not data:
+                data = self.mapped[self.pos:self.pos+_FETCH_SIZE]
+                if not data:
+                    # Truncated member
+                    break
+                self.pos += len(data)
+            data = decompressor.decompress(data, size)
+            if data:
+                self.inflated += len(data)
+                return data
+        return b''
+
+    def read_head(self) -> [bytes, None]:
+        # The next header block, None at the end of the member
+        head = b''
+        while True:
+            end = head.find(b'\r\n\r\n')
+            if end >= 0:
+                break
+            data = self.read(4096)
+            if not data and not head:
+                return None
+            if not data or len(head) > _WARC_HEAD_SIZE:
+                raise WarcError('bad WARC header block')
+            head += data
+        if not head.startswith(b'WARC/'):
+            raise WarcError('bad WARC header block')
+        self.buffer = head[end+4:] + self.buffer
+        return head[:end]
+
+    def skip(self, size: int) -> [int, None]:
+        # Skip size inflated bytes. When they would end the member, find the
+        # next one without inflating them: it starts with the gzip magic right
+        # after the ISIZE field of the member's trailer, the length of the
+        # member once inflated, and inflates to another WARC record. Return
+        # its offset when found
+        skipped = min(size, len(self.buffer))
+        self.buffer = self.buffer[skipped:]
+        size -= skipped
+        decompressor = self.decompressor
+        if size and not decompressor.eof:
+            start = self.pos - len(decompressor.unconsumed_tail)
+            # Deflate grows incompressible data by 5 bytes per 16 KiB block
+            limit = start + size + size // 1024 + 1024
+            marker = ((self.inflated + size) & 0xffffffff).to_bytes(4, 'little') + b'\x1f\x8b\x08'
+            offset = self.mapped.find(marker, start, limit)
+            while offset >= 0:
+                if _starts_warc(self.mapped, offset + 4):
+                    return offset + 4
+                offset = self.mapped.find(marker, offset + 1, limit)
+        while size:
+            data = self.read(min(size, 1 << 20))
+            if not data:
+                break
+            size -= len(data)
+        return None
+
+    def end(self) -> [int, None]:
+        if not self.decompressor.eof:
+            return None
+        return self.pos - len(self.decompressor.unused_data)
+
+
+def _starts_warc(mapped: mmap.mmap, offset: int) -> bool:
+    try:
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(mapped[offset:offset+1024], 5) == b'WARC/'
+    except zlib.error:
+        return False
+
+
+def _next_warc_record(mapped: mmap.mmap, pos: int) -> int:
+    # The offset of the first record start after pos, a line starting with
+    # 'WARC/' or a gzip member inflating to one, or the end of the file
+    line = mapped.find(b'\nWARC/', pos)
+    found = line + 1 if line >= 0 else len(mapped)
+    member = mapped.find(b'\x1f\x8b\x08', pos + 1, found)
+    while member >= 0:
+        if _starts_warc(mapped, member):
+            return member
+        member = mapped.find(b'\x1f\x8b\x08', member + 1, found)
+    return found
+
+
+def _warc_records(mapped: mmap.mmap):
+    # Yield (headers, block) for every record of a WARC file, where block
+    # iterates over the record block. Whatever part of the block is left
+    # unread is skipped when the next record is asked for. Whitespace
+    # between records is skipped, and so is anything else that is not a
+    # record where one should start, up to the next record, yielding
+    # (None, WarcError) telling where
+    pos = 0
+    while pos < len(mapped):
+        start = pos
+        if mapped[pos:pos+2] == b'\x1f\x8b':
+            reader = _GzipWarcReader(mapped, pos)
+        else:
+            reader = _WarcReader(mapped, pos)
+        end = None
+        try:
+            while True:
+                # Where this header block starts, if uncompressed
+                expected = reader.pos
+                head = reader.read_head()
+                if head is None:
+                    end = reader.end()
+                    break
+                headers = _parse_head(head)[1]
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    break
+                block = _WarcBlock(reader, length)
+                yield headers, block
+                # The block is followed by two CRLFs
+                end = reader.skip(block.remaining + 4)
+                if end is not None:
+                    break
+        except (WarcError, zlib.error):
+            pass
+        if end is not None and end > start:
+            pos = end
+            continue
+        # Go on from where an uncompressed record was expected, or from the
+        # start of a gzip member that could not be read
+        if isinstance(reader, _WarcReader):
+            start = expected
+        pos = _WARC_SPACE.match(mapped, start).end()
+        if pos > start and (mapped[pos:pos+5] == b'WARC/' or mapped[pos:pos+2] == b'\x1f\x8b' or pos == len(mapped)):
+            continue
+        end = _next_warc_record(mapped, pos)
+        yield None, WarcError('skipped %d bytes that are not a WARC record at offset %d' % (end - pos, pos))
+        pos = end
+
+
+class _WarcBlock:
+    # Iterate over the first remaining bytes read from reader
+
+    __slots__ = ('reader', 'remaining')
+
+    def __init__(self, reader: [_WarcReader, _GzipWarcReader], remaining: int):
+        self.reader = reader
+        self.remaining = remaining
+
+    def __iter__(self):
+        while self.remaining:
+            data = self.reader.read(min(self.remaining, _FETCH_SIZE))
+            if not data:
+                return
+            self.remaining -= len(data)
+            yield data
+
+
+def _split_http_head(chunks) -> ([bytes, None], object):
+    # The HTTP header block at the start of chunks, and the chunks after it
+    head = b''
+    for data in chunks:
+        head += data
+        end = head.find(b'\r\n\r\n')
+        if end >= 0:
+            rest = head[end+4:]
+            return head[:end], itertools.chain((rest,) if rest else (), chunks)
+        if len(head) > _WARC_HEAD_SIZE:
+            break
+    return None, None
+
+
+def _dechunk(chunks):
+    # Undo chunked transfer encoding, as recorded in a WARC response record
+    buffer = bytearray()
+    size = 0
+    for data in chunks:
+        buffer += data
+        while buffer:
+            if size > 0:
+                data = bytes(buffer[:size])
+                del buffer[:size]
+                size -= len(data)
+                if not size:
+                    # The CRLF after the chunk
+                    size = -2
+                yield data
+            elif size < 0:
+                skipped = min(-size, len(buffer))
+                del buffer[:skipped]
+                size += skipped
+            else:
+                end = buffer.find(b'\r\n')
+                if end < 0:
+                    break
+                size = int(buffer[:end].split(b';', 1)[0], 16)
+                del buffer[:end+2]
+                if not size:
+                    return
+
+
+def _inflate(decompressor, chunks):
+    # Inflate at most _FETCH_SIZE bytes at a time, like Fetcher._decode_body
+    for data in chunks:
+        while data:
+            data = decompressor.decompress(data, _FETCH_SIZE)
+            if data:
+                yield data
+            data = decompressor.unconsumed_tail
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+def _squeeze_warc_record(squeezer: Squeezer, headers: dict, block: _WarcBlock, default_charset: str) -> [Title, None]:
+    # Squeeze the HTML payload of a response or resource record, None for
+    # other records and payloads. Raises WarcError when the HTTP header block
+    # can not be read, like from a gzip member damaged within it
+    warc_type = headers.get('warc-type', '').lower()
+    content_type = headers.get('content-type', '')
+    if warc_type == 'response' and content_type.lower().startswith('application/http'):
+        try:
+            head, body = _split_http_head(iter(block))
+            if head is None:
+                return None
+            status_line, http_headers = _parse_head(head)
+            status_line = status_line.split(None, 2)
+            if len(status_line) < 2 or not status_line[0].startswith(b'HTTP/') or status_line[1] != b'200':
+                return None
+            content_type = http_headers.get('content-type', '')
+            if 'chunked' in http_headers.get('transfer-encoding', '').lower():
+                body = _dechunk(body)
+            decompressor = _decompressor(http_headers.get('content-encoding', ''))
+            if decompressor is not None:
+                body = _inflate(decompressor, body)
+        except (ValueError, zlib.error) as e:
+            raise WarcError('damaged HTTP header block in record %s: %s' % (headers.get('warc-record-id'), e))
+    elif warc_type == 'resource':
+        body = block
+    else:
+        return None
+    if content_type.partition(';')[0].strip().lower() not in _HTML_TYPES:
+        return None
+    squeezer.reset(default_charset, content_type or None)
+    try:
+        return _squeeze_stream(squeezer, body)
+    except (ValueError, zlib.error):
+        # A damaged chunk or gzip stream, squeeze what came before it
+        return squeezer.feed(final=True)
+
+
+def squeeze_warc(
+    path: [str, os.PathLike], default_charset: str='UTF-8', engine: str='scan', max_bytes: int=0, deadline: float=0
+):
+    """Squeeze the HTML pages of a WARC file, gzipped record by record or not,
+    and yield (record_id, target_uri, Title) for every response and resource
+    record holding one, in file order.
+
+    A gzipped record is inflated only until its result is enough, after which
+    its gzip member is skipped without inflating the rest of it. Bytes that
+    are not a record where one should start are skipped up to the next one,
+    yielding (None, None, WarcError) with their offset, and a record whose
+    HTTP header block can not be read yields a WarcError in place of its
+    Title.
+    """
+    squeezer = Squeezer(default_charset, engine, max_bytes=max_bytes, deadline=deadline)
+    with open(path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Empty files
+            return
+        with mapped:
+            for headers, block in _warc_records(mapped):
+                if headers is None:
+                    yield None, None, block
+                    continue
+                try:
+                    result = _squeeze_warc_record(squeezer, headers, block, default_charset)
+                except WarcError as e:
+                    result = e
+                if result is not None:
+                    yield headers.get('warc-record-id'), headers.get('warc-target-uri'), result
+
+
+def _squeeze_warc_list(path: [str, os.PathLike], default_charset: str, engine: str, max_bytes: int, deadline: float):
+    try:
+        return list(squeeze_warc(path, default_charset, engine, max_bytes, deadline))
+    except (OSError, WarcError, zlib.error) as e:
+        # Fail this file alone, not the others of squeeze_warcs
+        return e
+
+
+def squeeze_warcs(
+    paths, workers: [int, None]=None, default_charset: str='UTF-8', engine: str='scan', max_bytes: int=0,
+    deadline: float=0
+):
+    """Squeeze every WARC file with squeeze_warc, one file per worker process,
+    and yield (path, records) in input order, records being the list of
+    (record_id, target_uri, Title) of the file or the error raised reading
+    it."""
+    squeeze_path = functools.partial(
+        _squeeze_warc_list, default_charset=default_charset, engine=engine, max_bytes=max_bytes, deadline=deadline
+    )
+    paths = iter(paths)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for path in paths:
+            yield path, squeeze_path(path)
+        return
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        pending = collections.deque()
+        for path in paths:
+            pending.append((path, executor.submit(squeeze_path, path)))
+            if len(pending) >= workers * 2:
+                path, future = pending.popleft()
+                yield path, future.result()
+        while pending:
+            path, future = pending.popleft()
+            yield path, future.result()
+
+
+class _Output:
+    # Write results to a binary stream as indented JSON, NDJSON, TSV or
+    # length-prefixed binary records. keys are what identifies a result, like
+    # {'file': path}; TSV and binary records carry their values only. With
+    # raw, TSV and binary records hold the title and description as the bytes
+    # found in the page, followed by the charset to decode them with
+
+    __slots__ = ('stream', 'format', 'raw', 'flush')
+
+    FORMATS = ('json', 'ndjson', 'tsv', 'binary')
+
+    def __init__(self, stream, format: str='ndjson', raw: bool=False, flush: bool=False):
+        self.stream = stream
+        self.format = format
+        self.raw = raw
+        # Flush after every record, for --stream
+        self.flush = flush
+
+    def result(self, keys: dict, result: Title):
+        if self.format == 'json' or self.format == 'ndjson':
+            self._json(dict(keys, **result.as_dict()))
+            return
+        if self.raw:
+            fields = (
+                bytes(result.title) if result.title is not None else None,
+                bytes(result.description) if result.description is not None else None,
+                result.charset, result.eff_charset
+            )
+        else:
+            fields = (result.title_decode, result.description_decode, result.charset)
+        if self.format == 'tsv':
+            self._tsv(keys, b'1' if result.enough else b'0', fields)
+        else:
+            flags = result.enough | bool(result.budget_exhausted) << 2 | self.raw << 3
+            self._binary(flags, keys, fields)
+
+    def error(self, keys: dict, error: Exception):
+        message = str(error) or type(error).__name__
+        if self.format == 'json' or self.format == 'ndjson':
+            self._json(dict(keys, error=message))
+        elif self.format == 'tsv':
+            self._tsv(keys, b'error', (message,))
+        else:
+            self._binary(2, keys, (message,))
+
+    def _json(self, record: dict):
+        import json
+        indent = 4 if self.format == 'json' else None
+        self._write(json.dumps(record, ensure_ascii=False, indent=indent).encode('UTF-8', 'surrogateescape') + b'\n')
+
+    def _tsv(self, keys: dict, status: bytes, fields):
+        # Tabs, line breaks and backslashes are escaped, and None is \N
+        # like in PostgreSQL's COPY
+        columns = []
+        for value in itertools.chain(keys.values(), (status,), fields):
+            if value is None:
+                columns.append(b'\\N')
+                continue
+            if not isinstance(value, bytes):
+                value = str(value).encode('UTF-8', 'surrogateescape')
+            columns.append(
+                value.replace(b'\\', b'\\\\').replace(b'\t', b'\\t').replace(b'\n', b'\\n').replace(b'\r', b'\\r')
+            )
+        self._write(b'\t'.join(columns) + b'\n')
+
+    def _binary(self, flags: int, keys: dict, fields):
+        # The length of the rest of the record, a flags byte (1 enough, 2
+        # error, 4 budget exhausted, 8 raw), the number of fields, then every
+        # key and field as its length, -1 for None, and its bytes
+        values = tuple(keys.values()) + tuple(fields)
+        record = bytearray(struct.pack('<BB', flags, len(values)))
+        for value in values:
+            if value is None:
+                record += struct.pack('<i', -1)
+                continue
+            if not isinstance(value, bytes):
+                value = str(value).encode('UTF-8', 'surrogateescape')
+            record += struct.pack('<i', len(value))
+            record += value
+        self._write(struct.pack('<I', len(record)) + record)
+
+    def _write(self, data: bytes):
+        self.stream.write(data)
+        if self.flush:
+            self.stream.flush()
+
+
+def _squeeze_ndjson(squeezer: Squeezer, lines, output: _Output, chunk_size: int=_READ_SIZE, cache: [ResultCache, None]=None):
+    # Squeeze one document per JSON line, {"id": ..., "body": "<html>..."},
+    # with "base64" instead of "body" for pages not in UTF-8, or "path" for a
+    # file, and optionally the "content_type" it was served with, reusing the
+    # same Squeezer, and write one record per document. Files are cached by
+    # path, size and modification time, bodies by a hash of their bytes
+    import base64
+    import hashlib
+    import json
+    for line in lines:
+        if not line.strip():
+            continue
+        doc_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('expected a JSON object')
+            doc_id = request.get('id')
+            content_type = request.get('content_type')
+            squeezer.reset(content_type=content_type)
+            if 'path' in request:
+                body = None
+                stat = os.stat(request['path'])
+                key = 'file:%s:%d:%d' % (os.path.realpath(request['path']), stat.st_size, stat.st_mtime_ns)
+            else:
+                if 'base64' in request:
+                    body = base64.b64decode(request['base64'], validate=True)
+                elif 'body' in request:
+                    body = request['body'].encode('utf-8', 'surrogateescape')
+                else:
+                    raise ValueError('expected "body", "base64" or "path"')
+                key = 'blake2b:' + hashlib.blake2b(body, digest_size=16, key=str(content_type).encode()[:64]).hexdigest()
+            started = time.perf_counter()
+            result = cache.get(key) if cache is not None else None
+            if result is None:
+                if body is None:
+                    result = _squeeze_path(squeezer, request['path'])
+                else:
+                    body = memoryview(body)
+                    result = _squeeze_stream(squeezer, (body[i:i+chunk_size] for i in range(0, len(body), chunk_size)))
+                if cache is not None:
+                    seconds = time.perf_counter() - started
+                    if result.budget_exhausted:
+                        cache.record('misses', seconds)
+                    else:
+                        cache.put(key, result, seconds=seconds)
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            output.error(dict(id=doc_id), e)
+        else:
+            output.result(dict(id=doc_id), result)
+
+
+def _serve(path: str, output_format: str, raw: bool, chunk_size: int, engine: str, max_bytes: int, deadline: float):
+    # Squeeze the page sent over every connection to a Unix socket at path and
+    # send its result back, so that a caller spawning a process per page only
+    # pays for starting _connect
+    import socket
+    import socketserver
+    pool = SqueezerPool(engine=engine)
+
+    class Handler(socketserver.BaseRequestHandler):
+
+        def handle(self):
+            connection = self.request
+            with pool.squeezer() as squeezer:
+                squeezer.max_bytes = max_bytes
+                squeezer.deadline = deadline
+                result = _squeeze_stream(squeezer, iter(lambda: connection.recv(chunk_size), b''))
+            try:
+                with connection.makefile('wb') as stream:
+                    _Output(stream, output_format, raw).result({}, result)
+                connection.shutdown(socket.SHUT_WR)
+                # Take the rest of the page, which the client may still be
+                # sending
+                while connection.recv(65536):
+                    pass
+            except (BrokenPipeError, ConnectionResetError):
+                # The client went away without waiting for the result
+                pass
+
+    import errno
+    import signal
+    import stat
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        pass
+    else:
+        # Replace the socket a server left behind, but nothing else, and not
+        # the socket of a server still listening on it
+        if not stat.S_ISSOCK(mode):
+            raise FileExistsError(errno.EEXIST, 'not a socket', path)
+        with socket.socket(socket.AF_UNIX) as probe:
+            try:
+                probe.connect(path)
+            except ConnectionRefusedError:
+                os.unlink(path)
+            else:
+                raise FileExistsError(errno.EEXIST, 'another server listens on', path)
+    # Stop on SIGTERM the way Ctrl-C does, removing the socket
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+
+
+def _connect(path: str, read, write, chunk_size: int=_READ_SIZE):
+    # Send what read() returns to a _serve process listening at path until it
+    # answers, and write its answer
+    import select
+    import socket
+    with socket.socket(socket.AF_UNIX) as connection:
+        connection.connect(path)
+        try:
+            for data in _read_chunks(read, chunk_size):
+                if select.select((connection,), (), (), 0)[0]:
+                    # The result was enough before the end of the page
+                    break
+                connection.sendall(data)
+            connection.shutdown(socket.SHUT_WR)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                return
+            write(data)
+
+
+def _number_at_least(value: str, convert, minimum: int):
+    # Shared by the argparse types below; "not >=" also turns away a nan
+    import argparse
+    try:
+        number = convert(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid %s value: %r' % (convert.__name__, value))
+    if not number >= minimum:
+        raise argparse.ArgumentTypeError('must be at least %d: %r' % (minimum, value))
+    return number
+
+
+def _positive_int(value: str) -> int:
+    # An argparse type for sizes that must be at least 1
+    return _number_at_least(value, int, 1)
+
+
+def _non_negative_int(value: str) -> int:
+    # An argparse type for limits where 0 means none
+    return _number_at_least(value, int, 0)
+
+
+def _non_negative_float(value: str) -> float:
+    return _number_at_least(value, float, 0)
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == '--connect':
+        # Checked before argparse is even imported, since this is all a client
+        # of --serve does
+        _connect(sys.argv[2], sys.stdin.buffer.read, sys.stdout.buffer.write)
+        return
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description='Read an HTML page from stdin, or from every file given, and print its title and description.')
+    parser.add_argument('-v', action='store_true', help='print every HTML tag parsed')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes for files (default: number of CPUs)')
+    parser.add_argument('--engine', choices=('scan', 'table', 'byte'), default='scan', help='tokenizer engine (default: scan)')
+    parser.add_argument('--chunk-size', type=_positive_int, default=_READ_SIZE, help='bytes read from stdin at a time (default: %d)' % _READ_SIZE)
+    parser.add_argument('--max-chunk-size', type=int, default=0, help='double the read size after every read, up to this many bytes')
+    parser.add_argument('--fetch', action='store_true', help='treat the arguments as http(s) URLs and download them')
+    parser.add_argument('--per-host', type=_positive_int, default=4, help='concurrent downloads per host with --fetch (default: 4)')
+    parser.add_argument('--stream', action='store_true', help='read one JSON document per line from stdin, see Readme')
+    parser.add_argument('--warc', action='store_true', help='treat the files as WARC archives, gzipped or not, one per worker process')
+    parser.add_argument('--max-bytes', type=_non_negative_int, default=0, help='stop reading a page after this many bytes')
+    parser.add_argument('--deadline', type=_non_negative_float, default=0, help='stop reading a page after this many seconds')
+    parser.add_argument(
+        '--format', choices=_Output.FORMATS, default=None,
+        help='output format (default: json for stdin, ndjson otherwise), see Readme'
+    )
+    parser.add_argument('--raw', action='store_true', help='with --format tsv or binary, print the title and description undecoded')
+    parser.add_argument('--serve', metavar='PATH', help='squeeze the page sent to a Unix socket at PATH, see Readme')
+    parser.add_argument('--connect', metavar='PATH', help='send stdin to a --serve process at PATH and print its answer')
+    parser.add_argument('--profile', action='store_true', help='print where the time went to stderr, see Readme')
+    parser.add_argument('--cache', metavar='PATH', help='cache results of --fetch and --stream in this SQLite file')
+    parser.add_argument('--cache-ttl', type=float, default=3600, help='seconds a cached result stays fresh (default: 3600)')
+    parser.add_argument('--cache-size', type=int, default=100000, help='cached results kept at most (default: 100000)')
+    parser.add_argument('--cache-stats', action='store_true', help='print the hit rate and latencies of --cache and exit')
+    parser.add_argument('files', nargs='*', help='HTML files, printed as one JSON object per line')
+    args = parser.parse_args()
+    if args.cache_stats and not args.cache:
+        parser.error('--cache-stats needs --cache')
+    if args.profile and (args.fetch or args.warc or args.engine != 'scan'):
+        parser.error('--profile works with the scan engine on stdin, files and --stream')
+    if args.format is None:
+        args.format = 'ndjson' if args.files or args.stream else 'json'
+    if args.connect:
+        _connect(args.connect, sys.stdin.buffer.read, sys.stdout.buffer.write, args.chunk_size)
+        return
+    if args.serve:
+        try:
+            _serve(args.serve, args.format, args.raw, args.chunk_size, args.engine, args.max_bytes, args.deadline)
+        except FileExistsError as e:
+            parser.error('--serve: %s' % e)
+        return
+    if args.raw and args.format not in ('tsv', 'binary'):
+        parser.error('--raw needs --format tsv or binary')
+    profile = Profile() if args.profile else None
+
+    cache = ResultCache(args.cache, args.cache_ttl, args.cache_size) if args.cache else None
+    # One buffered writer for every result, flushed after every one in
+    # --stream only
+    stream = open(sys.stdout.fileno(), 'wb', buffering=65536, closefd=False)
+    output = _Output(stream, args.format, args.raw, flush=args.stream)
+    with stream, contextlib.closing(cache) if cache is not None else contextlib.nullcontext():
+        if args.cache_stats:
+            stream.write(json.dumps(cache.stats()).encode() + b'\n')
+            return
+
+        if args.fetch:
+            for url, result in zip(args.files, squeeze_urls(
+                args.files, per_host=args.per_host, engine=args.engine, cache=cache, max_bytes=args.max_bytes, deadline=args.deadline
+            )):
+                if isinstance(result, Exception):
+                    output.error(dict(url=url), result)
+                else:
+                    output.result(dict(url=url), result)
+            return
+
+        if args.stream:
+            squeezer = Squeezer(engine=args.engine, max_bytes=args.max_bytes, deadline=args.deadline)
+            if args.v:
+                squeezer.set_debug()
+            squeezer.set_profile(profile)
+            _squeeze_ndjson(squeezer, sys.stdin.buffer, output, args.chunk_size, cache)
+            if profile is not None:
+                sys.stderr.write(profile.report() + '\n')
+            return
+
+        if args.warc:
+            for path, records in squeeze_warcs(
+                args.files, workers=args.jobs, engine=args.engine, max_bytes=args.max_bytes, deadline=args.deadline
+            ):
+                if isinstance(records, Exception):
+                    output.error(dict(file=path), records)
+                    continue
+                for record_id, target_uri, result in records:
+                    if isinstance(result, Exception):
+                        output.error(dict(file=path), result)
+                    else:
+                        output.result(dict(id=record_id, url=target_uri), result)
+            return
+
+        if args.files:
+            if profile is not None:
+                # Profiled in this process, so that every file counts into profile
+                squeezer = Squeezer(engine=args.engine, max_bytes=args.max_bytes, deadline=args.deadline)
+                squeezer.set_profile(profile)
+                results = _squeeze_documents(squeezer, args.files, 'UTF-8')
+            else:
+                results = squeeze_many(
+                    args.files, workers=args.jobs, engine=args.engine, max_bytes=args.max_bytes, deadline=args.deadline
+                )
+            for path, result in zip(args.files, results):
+                if isinstance(result, Exception):
+                    output.error(dict(file=path), result)
+                else:
+                    output.result(dict(file=path), result)
+            if profile is not None:
+                sys.stderr.write(profile.report() + '\n')
+            return
+
+        squeezer = Squeezer(engine=args.engine, max_bytes=args.max_bytes, deadline=args.deadline)
+        if args.v:
+            squeezer.set_debug()
+        squeezer.set_profile(profile)
+        result = _squeeze_stream(squeezer, _read_chunks(sys.stdin.buffer.read, args.chunk_size, args.max_chunk_size))
+        if args.v:
+            sys.stderr.write('\n')
+        output.result({}, result)
+        if profile is not None:
+            sys.stderr.write(profile.report() + '\n')
 
 
 if __name__ == '__main__':